@@ -0,0 +1,184 @@
+# chunked_ufunc.py
+
+# np.sqrt(arr), np.maximum(x, y) and np.modf(arr) need their operands in memory. apply_ufunc()
+# streams aligned chunks of one or more memory-mapped inputs (.npy or raw binary) through a
+# ufunc on a thread pool and writes straight into memory-mapped outputs, so an elementwise
+# transform of any size runs within a fixed memory budget. Multi-output ufuncs like np.modf write
+# one output file per result. Chunks are taken from a flat view of every operand, so array inputs,
+# where= masks and outputs must be C-contiguous (flattening anything else would copy it whole into
+# memory); a Fortran-ordered array can be passed as its transpose, arr.T, with the outputs read
+# back transposed.
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Bytes of input read per chunk, summed over all inputs
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def open_input(source, dtype=None, shape=None):
+    '''
+    Memory-map an input: ndarrays pass through, .npy paths are opened with np.load (their header
+    gives the dtype and shape) and other paths are treated as raw binary files of the given dtype
+    (and optional shape)
+    '''
+    if isinstance(source, np.ndarray):
+        return source
+    if str(source).endswith('.npy'):
+        return np.load(source, mmap_mode='r')
+    if dtype is None:
+        raise ValueError(f'dtype is required to open raw binary input {source}')
+    return np.memmap(source, dtype=dtype, mode='r', shape=shape)
+
+
+def create_output(target, shape, dtype):
+    '''
+    Create a writable memory-mapped output: .npy paths get a header, other paths are raw.
+    Preallocated arrays must be C-contiguous, since chunks are written through a flat view of them
+    '''
+    if isinstance(target, np.ndarray):
+        if target.shape != shape:
+            raise ValueError(f'output has shape {target.shape}, expected {shape}')
+        if not target.flags.c_contiguous or not target.flags.writeable:
+            raise ValueError('preallocated outputs must be writable and C-contiguous')
+        return target
+    if str(target).endswith('.npy'):
+        return np.lib.format.open_memmap(target, mode='w+', dtype=dtype, shape=shape)
+    return np.memmap(target, dtype=dtype, mode='w+', shape=shape)
+
+
+def _is_scalar(x):
+    return isinstance(x, (int, float, complex, np.generic))
+
+
+class Progress:
+    '''Prints bytes processed and throughput in GB/s as chunks complete'''
+
+    def __init__(self, total_bytes, stream=sys.stderr, every=1.0):
+        self.total_bytes = total_bytes
+        self.stream = stream
+        self.every = every
+        self.done_bytes = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, nbytes):
+        self.done_bytes += nbytes
+        now = time.perf_counter()
+        if now - self.last >= self.every or self.done_bytes >= self.total_bytes:
+            self.last = now
+            if self.stream is not None:
+                print(f'\r{self.done_bytes / 1e9:.2f} / {self.total_bytes / 1e9:.2f} GB '
+                      f'({self.throughput():.2f} GB/s)', end='', file=self.stream, flush=True)
+
+    def throughput(self):
+        elapsed = time.perf_counter() - self.start
+        return self.done_bytes / 1e9 / elapsed if elapsed else 0.0
+
+
+def apply_ufunc(ufunc, inputs, outputs, chunk_bytes=CHUNK_BYTES, n_threads=None, dtype=None,
+                shape=None, out_dtypes=None, progress=True, **ufunc_kwargs):
+    '''
+    Apply a ufunc chunk by chunk over memory-mapped operands
+
+    Parameters
+    ----------
+    ufunc : numpy ufunc, e.g. np.sqrt, np.maximum or np.modf
+    inputs : list of ndarrays / memmaps / paths, one per ufunc input (scalars are broadcast)
+    outputs : list of paths or preallocated arrays, one per ufunc output
+    chunk_bytes : bytes of input per chunk, bounding memory use per worker
+    n_threads : number of worker threads, defaults to the CPU count
+    dtype, shape : layout of raw binary inputs (.npy inputs use their own header)
+    out_dtypes : output dtypes, inferred from the ufunc's type resolution when omitted
+    progress : print progress and throughput to stderr
+    ufunc_kwargs : passed through to the ufunc (e.g. casting=); where= may be a scalar or an
+                   array of the inputs' shape, which is chunked along with them
+
+    Returns
+    -------
+    outputs : list of memory-mapped output arrays
+    stats : dict with bytes processed, elapsed seconds and throughput in GB/s
+    '''
+    if len(inputs) != ufunc.nin:
+        raise ValueError(f'{ufunc.__name__} takes {ufunc.nin} inputs, got {len(inputs)}')
+    if len(outputs) != ufunc.nout:
+        raise ValueError(f'{ufunc.__name__} has {ufunc.nout} outputs, got {len(outputs)}')
+
+    arrays = [x if _is_scalar(x) else open_input(x, dtype, shape) for x in inputs]
+    operands = [x for x in arrays if not _is_scalar(x)]
+    if not operands:
+        raise ValueError('at least one input must be an array or a file')
+    full_shape = operands[0].shape
+    if any(x.shape != full_shape for x in operands):
+        raise ValueError('array inputs must have the same shape')
+    if not all(x.flags.c_contiguous for x in operands):
+        raise ValueError('array inputs must be C-contiguous (pass Fortran-ordered arrays as arr.T)')
+
+    where = ufunc_kwargs.pop('where', True)
+    if not _is_scalar(where):
+        where = np.asarray(where)
+        if where.ndim == 0:
+            where = bool(where)
+        elif where.shape != full_shape:
+            raise ValueError(f'where has shape {where.shape}, expected {full_shape}')
+        elif not where.flags.c_contiguous:
+            raise ValueError('where must be C-contiguous')
+        else:
+            where = where.reshape(-1)
+
+    if out_dtypes is None:
+        samples = [x if _is_scalar(x) else x.reshape(-1)[:1] for x in arrays]
+        with np.errstate(all='ignore'):
+            result = ufunc(*samples)
+        out_dtypes = [r.dtype for r in (result if ufunc.nout > 1 else (result,))]
+    outs = [create_output(target, full_shape, dt) for target, dt in zip(outputs, out_dtypes)]
+
+    flat_in = [x if _is_scalar(x) else x.reshape(-1) for x in arrays]
+    flat_out = [x.reshape(-1) for x in outs]
+    itemsize = sum(x.itemsize for x in operands)
+    chunk = max(1, chunk_bytes // itemsize)
+    size = int(np.prod(full_shape))
+
+    meter = Progress(size * itemsize, stream=sys.stderr if progress else None)
+
+    def run_chunk(start):
+        stop = min(start + chunk, size)
+        args = [x if _is_scalar(x) else x[start:stop] for x in flat_in]
+        mask = where if _is_scalar(where) else where[start:stop]
+        ufunc(*args, out=tuple(x[start:stop] for x in flat_out), where=mask, **ufunc_kwargs)
+        return (stop - start) * itemsize
+
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        for nbytes in pool.map(run_chunk, range(0, size, chunk)):
+            meter.update(nbytes)
+    if progress:
+        print(file=sys.stderr)
+
+    for x in outs:
+        if isinstance(x, np.memmap):
+            x.flush()
+
+    elapsed = time.perf_counter() - meter.start
+    stats = {'bytes': meter.done_bytes, 'seconds': elapsed, 'gb_per_s': meter.throughput()}
+    return outs, stats
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        arr = np.random.randn(1_000_000) * 5
+        np.save(os.path.join(tmp, 'arr.npy'), arr)
+        (remainder, whole_part), stats = apply_ufunc(
+            np.modf, [os.path.join(tmp, 'arr.npy')],
+            [os.path.join(tmp, 'remainder.npy'), os.path.join(tmp, 'whole.npy')],
+            chunk_bytes=1 << 20)
+        assert (remainder == np.modf(arr)[0]).all() and (whole_part == np.modf(arr)[1]).all()
+        print(stats)
+        del remainder, whole_part
@@ -0,0 +1,370 @@
+# columnar.py
+
+# The names/data pair from chapter 4 is the shape of most tables: a key column next to numeric
+# columns. This module stores such tables on disk in a simple columnar format:
+#
+#   <table>/_schema.json    column names, in order, and the row count
+#   <table>/<column>.col    the column's values as raw fixed-width rows (memory-mappable), then a
+#                           footer with the minimum, maximum and null count of every block of
+#                           block_rows rows, then a small JSON header, its length and a magic tag
+#
+# Opening a table only reads the schema and the tail of each column file and maps the rest, so it
+# takes the same time for 100 GB as for 100 rows. Filters are pushed down to the block statistics:
+#
+# table = Table('people')
+# bob = table.filter([('names', '==', 'Bob')])
+# positive = table.filter([(('data', 0), '>', 0)], columns=['names'])
+#
+# reads only the blocks whose min/max range can contain a matching row. Columns may be numbers,
+# booleans, datetimes or fixed-width strings, and may have more than one value per row (the 7x4
+# data array is a single column whose rows have shape (4,)); statistics are kept per field.
+# NaN and NaT are counted as nulls and left out of the minimum and maximum.
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'PYDACOL1'
+BLOCK_ROWS = 65536
+SCHEMA_FILE = '_schema.json'
+
+# Statistics arrays in the footer start at a multiple of this many bytes
+FOOTER_ALIGN = 64
+
+_TAIL = struct.Struct('<Q8s')
+
+_COMPARISONS = {
+    '==': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal,
+    '>': np.greater, '>=': np.greater_equal,
+}
+
+
+def _null_mask(values):
+    if values.dtype.kind in 'fc':
+        return np.isnan(values)
+    if values.dtype.kind in 'mM':
+        return np.isnat(values)
+    return None
+
+
+def _block_stats(block):
+    '''Per-field (min, max, null count) of one block of rows, ignoring NaN/NaT'''
+    nulls = _null_mask(block)
+    if block.dtype.kind in 'SU':
+        # No minimum/maximum ufunc loops for strings; the ends of a sort give both
+        ordered = np.sort(block, axis=0)
+        return ordered[0], ordered[-1], np.zeros(block.shape[1:], dtype=np.int64)
+    if nulls is None:
+        return block.min(axis=0), block.max(axis=0), np.zeros(block.shape[1:], dtype=np.int64)
+    # fmin/fmax skip NaN and NaT unless a field is null in every row
+    with np.errstate(invalid='ignore'):
+        return (np.fmin.reduce(block, axis=0), np.fmax.reduce(block, axis=0),
+                nulls.sum(axis=0, dtype=np.int64))
+
+
+def _raw(arr):
+    # Datetimes do not export the buffer protocol; write every dtype through a byte view
+    return np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+
+
+class _ColumnWriter:
+
+    def __init__(self, path, dtype, row_shape, block_rows):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.dtype = dtype
+        self.row_shape = row_shape
+        self.block_rows = block_rows
+        self.file = open(self.tmp_path, 'wb')
+        self.pending = []
+        self.pending_rows = 0
+        self.n_rows = 0
+        self.mins, self.maxs, self.nulls = [], [], []
+
+    def _write_block(self, block):
+        self.file.write(_raw(block))
+        low, high, nulls = _block_stats(block)
+        self.mins.append(low)
+        self.maxs.append(high)
+        self.nulls.append(nulls)
+        self.n_rows += len(block)
+
+    def append(self, values):
+        if self.pending:
+            # Complete the partial block left over from the previous append first
+            take = min(self.block_rows - self.pending_rows, len(values))
+            # Copy: the caller may refill its buffer before the block is complete
+            self.pending.append(values[:take].copy())
+            self.pending_rows += take
+            values = values[take:]
+            if self.pending_rows < self.block_rows:
+                return
+            self._write_block(np.concatenate(self.pending))
+            self.pending, self.pending_rows = [], 0
+        n_full = len(values) // self.block_rows * self.block_rows
+        for start in range(0, n_full, self.block_rows):
+            self._write_block(values[start:start + self.block_rows])
+        if n_full < len(values):
+            self.pending = [values[n_full:].copy()]
+            self.pending_rows = len(values) - n_full
+
+    def close(self):
+        if self.pending:
+            self._write_block(np.concatenate(self.pending))
+            self.pending = []
+        offset = self.file.tell()
+        stats_offset = -(-offset // FOOTER_ALIGN) * FOOTER_ALIGN
+        self.file.write(b'\0' * (stats_offset - offset))
+        stats_shape = (len(self.mins),) + self.row_shape
+        for stats, dtype in ((self.mins, self.dtype), (self.maxs, self.dtype),
+                             (self.nulls, np.int64)):
+            self.file.write(_raw(np.asarray(stats, dtype=dtype).reshape(stats_shape)))
+        header = json.dumps({
+            'dtype': self.dtype.str,
+            'row_shape': list(self.row_shape),
+            'n_rows': self.n_rows,
+            'block_rows': self.block_rows,
+            'n_blocks': len(self.mins),
+            'stats_offset': stats_offset,
+        }).encode()
+        self.file.write(header)
+        self.file.write(_TAIL.pack(len(header), MAGIC))
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def _cast_chunk(name, values, dtype):
+    '''values as dtype, raising ValueError rather than truncating strings or dropping precision'''
+    if values.dtype == dtype:
+        return values
+    if dtype.kind in 'SU' and values.dtype.kind == dtype.kind:
+        # Fixed by the first chunk; a longer string in a later chunk would be cut short
+        width = np.char.str_len(values).max(initial=0)
+        if width > dtype.itemsize // np.dtype(f'{dtype.kind}1').itemsize:
+            raise ValueError(f'column {name!r} is {dtype} but got a string of length {width}; '
+                             'the first chunk fixes the width')
+        return values.astype(dtype)
+    if not np.can_cast(values.dtype, dtype, 'safe'):
+        raise ValueError(f'column {name!r} is {dtype}; cannot store {values.dtype} without '
+                         'losing data')
+    return values.astype(dtype)
+
+
+class TableWriter:
+    '''
+    Write a table in chunks of rows, so tables larger than memory can be built
+
+    with TableWriter('people') as writer:
+        for names, data in chunks:
+            writer.append({'names': names, 'data': data})
+
+    The first append fixes the columns, their dtypes and row shapes; later chunks must cast to
+    those dtypes safely (a longer string, or a float for an int column, raises). Column files
+    are written under temporary names and renamed into place, and the schema is written last.
+    '''
+
+    def __init__(self, path, block_rows=BLOCK_ROWS):
+        self.path = path
+        self.block_rows = block_rows
+        self.columns = None
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, columns):
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError('all columns must have the same number of rows')
+
+        if self.columns is None:
+            self.columns = {}
+            for name, values in columns.items():
+                if os.sep in name or name.startswith('_') or values.dtype.hasobject:
+                    raise ValueError(f'cannot store column {name!r} ({values.dtype})')
+                self.columns[name] = _ColumnWriter(os.path.join(self.path, name + '.col'),
+                                                   values.dtype, values.shape[1:],
+                                                   self.block_rows)
+        elif columns.keys() != self.columns.keys():
+            raise ValueError(f'expected columns {list(self.columns)}')
+
+        for name, values in columns.items():
+            writer = self.columns[name]
+            if values.shape[1:] != writer.row_shape:
+                raise ValueError(f'rows of {name!r} must have shape {writer.row_shape}')
+            writer.append(_cast_chunk(name, values, writer.dtype))
+
+    def close(self):
+        if self.columns is None:
+            raise ValueError('no rows were appended')
+        for writer in self.columns.values():
+            writer.close()
+        n_rows = next(iter(self.columns.values())).n_rows
+        tmp_path = os.path.join(self.path, SCHEMA_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'columns': list(self.columns), 'n_rows': n_rows}, f)
+        os.replace(tmp_path, os.path.join(self.path, SCHEMA_FILE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+def write_table(path, columns, block_rows=BLOCK_ROWS):
+    '''Write a dict of equal-length arrays as a table'''
+    with TableWriter(path, block_rows) as writer:
+        writer.append(columns)
+
+
+class Column:
+    '''A column file mapped into memory: values, and min/max/null-count arrays per block'''
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            f.seek(-_TAIL.size, os.SEEK_END)
+            header_length, magic = _TAIL.unpack(f.read(_TAIL.size))
+            if magic != MAGIC:
+                raise ValueError(f'{path} is not a column file')
+            f.seek(-_TAIL.size - header_length, os.SEEK_END)
+            header = json.loads(f.read(header_length))
+
+        self.path = path
+        self.dtype = np.dtype(header['dtype'])
+        self.row_shape = tuple(header['row_shape'])
+        self.n_rows = header['n_rows']
+        self.block_rows = header['block_rows']
+        self.n_blocks = header['n_blocks']
+
+        def mapped(dtype, shape, offset):
+            if not np.prod(shape):
+                return np.empty(shape, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+        stats_shape = (self.n_blocks,) + self.row_shape
+        stats_bytes = self.dtype.itemsize * int(np.prod(stats_shape))
+        offset = header['stats_offset']
+        self.values = mapped(self.dtype, (self.n_rows,) + self.row_shape, 0)
+        self.mins = mapped(self.dtype, stats_shape, offset)
+        self.maxs = mapped(self.dtype, stats_shape, offset + stats_bytes)
+        self.nulls = mapped(np.int64, stats_shape, offset + 2 * stats_bytes)
+
+    def block(self, index):
+        start = index * self.block_rows
+        return self.values[start:start + self.block_rows]
+
+
+class Table:
+    '''
+    A table written by write_table()/TableWriter, opened without reading any column data
+
+    Parameters
+    ----------
+    path : the table directory
+    '''
+
+    def __init__(self, path):
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        self.path = path
+        self.n_rows = schema['n_rows']
+        self.columns = {name: Column(os.path.join(path, name + '.col'))
+                        for name in schema['columns']}
+        block_rows = {column.block_rows for column in self.columns.values()}
+        if len(block_rows) != 1:
+            raise ValueError('all columns of a table must use the same block size')
+        self.block_rows = block_rows.pop()
+        self.n_blocks = -(-self.n_rows // self.block_rows)
+
+    def __getitem__(self, name):
+        '''The memory-mapped values of a column'''
+        return self.columns[name].values
+
+    def __len__(self):
+        return self.n_rows
+
+    def _field(self, spec):
+        # 'names' or ('data', 0) for the first field of each row of 'data'
+        name, field = (spec, ()) if isinstance(spec, str) else (spec[0], tuple(spec[1:]))
+        column = self.columns[name]
+        if len(field) != len(column.row_shape):
+            raise ValueError(f'predicate on {name!r} must select a single field of its rows')
+        return column, (slice(None),) + field
+
+    def blocks_matching(self, predicates):
+        '''
+        Indices of the blocks that may hold rows satisfying every predicate, from the footer
+        statistics alone
+
+        Parameters
+        ----------
+        predicates : list of (column, op, value) with op one of == != < <= > >=; column is a
+                     column name, or (name, index...) for one field of a multi-value column
+        '''
+        may_match = np.ones(self.n_blocks, dtype=bool)
+        for spec, op, value in predicates:
+            column, field = self._field(spec)
+            low, high, nulls = column.mins[field], column.maxs[field], column.nulls[field]
+            with np.errstate(invalid='ignore'):
+                if op == '==':
+                    hit = (low <= value) & (value <= high)
+                elif op == '!=':
+                    # Only a block whose every value equals the constant can be skipped
+                    hit = ~((low == value) & (high == value)) | (nulls > 0)
+                elif op in ('<', '<='):
+                    hit = _COMPARISONS[op](low, value)
+                elif op in ('>', '>='):
+                    hit = _COMPARISONS[op](high, value)
+                else:
+                    raise ValueError(f'unknown comparison {op!r}')
+            may_match &= np.asarray(hit, dtype=bool)
+        return np.flatnonzero(may_match)
+
+    def filter(self, predicates, columns=None):
+        '''
+        Rows satisfying every predicate (see blocks_matching), reading only candidate blocks
+
+        Returns
+        -------
+        result : dict of column name -> ndarray of the selected rows, for columns (default all)
+        '''
+        columns = list(self.columns) if columns is None else list(columns)
+        pieces = {name: [] for name in columns}
+        for index in self.blocks_matching(predicates):
+            mask = None
+            for spec, op, value in predicates:
+                column, field = self._field(spec)
+                hit = _COMPARISONS[op](column.block(index)[field], value)
+                mask = hit if mask is None else mask & hit
+            if mask is not None and not mask.any():
+                continue
+            for name in columns:
+                block = self.columns[name].block(index)
+                pieces[name].append(np.array(block if mask is None else block[mask]))
+
+        result = {}
+        for name in columns:
+            column = self.columns[name]
+            result[name] = (np.concatenate(pieces[name]) if pieces[name] else
+                            np.empty((0,) + column.row_shape, dtype=column.dtype))
+        return result
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    names = np.array(['Bob', 'Joe', 'Will', 'Bob', 'Will', 'Joe', 'Joe'])
+    data = np.random.randn(7, 4)
+
+    path = os.path.join(tempfile.mkdtemp(), 'people')
+    write_table(path, {'names': names, 'data': data}, block_rows=2)
+    table = Table(path)
+
+    bob = table.filter([('names', '==', 'Bob')])
+    assert (bob['data'] == data[names == 'Bob']).all()
+    positive = table.filter([(('data', 0), '>', 0)], columns=['names'])
+    assert (positive['names'] == names[data[:, 0] > 0]).all()
+    print(table.blocks_matching([('names', '==', 'Will')]), bob)
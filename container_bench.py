@@ -0,0 +1,261 @@
+# container_bench.py
+
+# Chapter 3 makes four performance claims in its comments: 'insert' is expensive compared with
+# 'append', checking whether a list contains a value is slower than doing so with a set or dict,
+# building a list with + is slower than with 'extend', and defaultdict makes grouping easier than
+# setdefault. This script measures each of them on the hardware it runs on.
+#
+# Every idiom is timed as the cost of one operation on a container that already holds n elements,
+# for n from 10^3 to 10^7, and the container is kept at size n while it is timed (an insert is
+# paired with a pop from the end, and so on), so the time per operation shows how each variant
+# scales. The report gives operations per second, the scaling exponent fitted over all sizes
+# (about 1 for a linear-time operation, about 0 for a constant-time one) and whether the chapter's
+# claim holds. Results can be saved as a JSON baseline and later runs compared against it:
+#
+# > python container_bench.py --save container_baseline.json
+# > python container_bench.py --compare container_baseline.json --threshold 0.25
+#
+# The exit status is 1 if a claim does not hold or a variant got slower than the baseline by more
+# than the threshold.
+
+import argparse
+import collections
+import json
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_SIZES = [10 ** k for k in range(3, 8)]
+
+# Keys for the grouping idioms are drawn from this many precomputed random values
+KEY_POOL = 1 << 16
+
+
+def _insert_front(n):
+    lst = list(range(n))
+
+    def run(k):
+        for _ in range(k):
+            lst.insert(0, None)
+            lst.pop()
+    return run
+
+
+def _append(n):
+    lst = list(range(n))
+
+    def run(k):
+        for _ in range(k):
+            lst.append(None)
+            lst.pop()
+    return run
+
+
+def _membership(build):
+    def setup(n):
+        container = build(range(n))
+        # Look for a value that is not there: the worst case for a list scan
+        missing = -1
+
+        def run(k):
+            for _ in range(k):
+                missing in container
+        return run
+    return setup
+
+
+CHUNK = [7, 8, (2, 3)] * 10
+
+
+def _concat(n):
+    everything = list(range(n))
+
+    def run(k):
+        for _ in range(k):
+            # What 'everything = everything + chunk' costs once everything holds n elements
+            result = everything + CHUNK
+        return result
+    return run
+
+
+def _extend(n):
+    everything = list(range(n))
+    size = len(CHUNK)
+
+    def run(k):
+        for _ in range(k):
+            everything.extend(CHUNK)
+            del everything[-size:]
+    return run
+
+
+def _grouping_keys(n):
+    return np.random.default_rng(0).integers(0, n, KEY_POOL).tolist()
+
+
+def _setdefault(n):
+    groups = {key: [] for key in range(n)}
+    keys = _grouping_keys(n)
+
+    def run(k):
+        for i in range(k):
+            groups.setdefault(keys[i & (KEY_POOL - 1)], []).append(i)
+    return run
+
+
+def _defaultdict(n):
+    groups = collections.defaultdict(list, {key: [] for key in range(n)})
+    keys = _grouping_keys(n)
+
+    def run(k):
+        for i in range(k):
+            groups[keys[i & (KEY_POOL - 1)]].append(i)
+    return run
+
+
+# idiom -> slow variant, fast variant(s) and margin: the claim holds when every fast variant does
+# more than margin times the slow variant's ops/sec at the largest size. The chapter only says
+# defaultdict is easier than setdefault, so for grouping it just must not be clearly slower.
+IDIOMS = {
+    'insert_vs_append': {'slow': ('insert', _insert_front), 'fast': [('append', _append)],
+                         'margin': 1.0},
+    'membership': {'slow': ('list', _membership(list)),
+                   'fast': [('set', _membership(set)), ('dict', _membership(dict.fromkeys))],
+                   'margin': 1.0},
+    'concat_vs_extend': {'slow': ('+', _concat), 'fast': [('extend', _extend)], 'margin': 1.0},
+    'grouping': {'slow': ('setdefault', _setdefault), 'fast': [('defaultdict', _defaultdict)],
+                 'margin': 0.9},
+}
+
+
+def time_per_op(run, min_time=0.2, repeat=3):
+    '''
+    Seconds per operation: the operation count is doubled until one batch takes min_time (as in
+    timeit's autorange), then the best of repeat batches is used
+    '''
+    k = 1
+    while True:
+        start = time.perf_counter()
+        run(k)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        k *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        run(k)
+        best = min(best, time.perf_counter() - start)
+    return best / k
+
+
+def scaling_exponent(sizes, seconds):
+    '''Slope of log(time per operation) against log(n)'''
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, idioms=None, min_time=0.2, repeat=3, log=None):
+    '''
+    Returns
+    -------
+    results : {idiom: {'variants': {name: {'ops_per_sec': {n: ...}, 'exponent': ...}},
+                       'claim_holds': bool}}
+    '''
+    results = {}
+    for idiom in idioms or IDIOMS:
+        spec = IDIOMS[idiom]
+        variants = {}
+        for name, setup in [spec['slow']] + spec['fast']:
+            seconds = []
+            for n in sizes:
+                run = setup(n)
+                seconds.append(time_per_op(run, min_time, repeat))
+                del run
+                if log:
+                    log(f'{idiom:<18}{name:<12}n={n:<10}{1 / seconds[-1]:>14,.0f} ops/s')
+            variants[name] = {
+                'ops_per_sec': {str(n): 1 / s for n, s in zip(sizes, seconds)},
+                'exponent': scaling_exponent(sizes, seconds),
+            }
+        largest = str(sizes[-1])
+        slow = variants[spec['slow'][0]]['ops_per_sec'][largest]
+        results[idiom] = {
+            'variants': variants,
+            'claim_holds': all(variants[name]['ops_per_sec'][largest] > slow * spec['margin']
+                               for name, _ in spec['fast']),
+        }
+    return results
+
+
+def compare(results, baseline, threshold=0.25):
+    '''
+    Variants whose ops/sec dropped below (1 - threshold) times the baseline at any size present in
+    both runs
+
+    Returns
+    -------
+    regressions : list of (idiom, variant, n, baseline ops/sec, current ops/sec)
+    '''
+    regressions = []
+    for idiom, entry in results.items():
+        for name, variant in entry['variants'].items():
+            base = baseline.get(idiom, {}).get('variants', {}).get(name, {}).get('ops_per_sec', {})
+            for n, ops in variant['ops_per_sec'].items():
+                if n in base and ops < base[n] * (1 - threshold):
+                    regressions.append((idiom, name, int(n), base[n], ops))
+    return regressions
+
+
+def format_report(results):
+    sizes = next(iter(next(iter(results.values()))['variants'].values()))['ops_per_sec']
+    header = f'{"idiom":<18}{"variant":<12}' + ''.join(f'{"n=" + n:>14}' for n in sizes)
+    lines = [header + f'{"exponent":>10}']
+    for idiom, entry in results.items():
+        for name, variant in entry['variants'].items():
+            exponent = variant['exponent']
+            lines.append(f'{idiom:<18}{name:<12}'
+                         + ''.join(f'{ops:>14,.0f}' for ops in variant['ops_per_sec'].values())
+                         + (f'{exponent:>10.2f}' if exponent is not None else f'{"n/a":>10}'))
+        lines.append(f'{"":<18}claim {"holds" if entry["claim_holds"] else "DOES NOT HOLD"}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the chapter 3 container idioms')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--idioms', nargs='+', choices=list(IDIOMS))
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds each timed batch must take')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', help='JSON baseline to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed fractional drop in ops/sec relative to the baseline')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    log = None if args.quiet else lambda line: print(line, file=sys.stderr)
+    results = run_benchmarks(sorted(args.sizes), args.idioms, args.min_time, args.repeat, log)
+    print(format_report(results))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = not all(entry['claim_holds'] for entry in results.values())
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for idiom, name, n, before, after in regressions:
+            print(f'REGRESSION {idiom} {name} n={n}: {before:,.0f} -> {after:,.0f} ops/s '
+                  f'({after / before - 1:+.0%})')
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+# copy_audit.py
+
+# Slices, .T and reshape of contiguous data are views, while boolean indexing, fancy indexing and
+# astype always copy. In a long pipeline those copies are easy to miss. CopyAuditor tracks arrays
+# through a pipeline and records every operation whose result occupies a new buffer: the
+# operation, bytes, shape, dtype, the calling line and the stage it happened in. Copies that could
+# have been avoided (fancy indices that form a slice, astype to the same dtype, ufunc results that
+# could have been written in place with out=) are flagged with a hint.
+#
+# np.array, np.asarray, np.asanyarray, np.ascontiguousarray and np.asfortranarray do not dispatch
+# through __array_function__, so while a CopyAuditor is active those attributes of the numpy
+# module are replaced with versions that record a copy of a tracked array. Names bound before the
+# auditor started (from numpy import ascontiguousarray) still refer to the originals, and their
+# copies are not seen.
+#
+# with CopyAuditor() as audit:
+#     data = audit.track(np.random.randn(7, 4))
+#     with audit.stage('filter'):
+#         bob = data[names == 'Bob']
+# print(audit.report())
+
+import contextlib
+import functools
+import os
+import traceback
+
+import numpy as np
+
+_THIS_FILE = os.path.abspath(__file__)
+_NUMPY_DIR = os.path.dirname(np.__file__)
+
+# The auditor receiving records; set while a CopyAuditor is active
+_active = None
+
+# Array conversion functions that bypass __array_function__, patched while an auditor is active
+_CONVERSIONS = ('array', 'asarray', 'asanyarray', 'ascontiguousarray', 'asfortranarray')
+_originals = {}
+
+
+def _call_site():
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename != _THIS_FILE and not filename.startswith(_NUMPY_DIR):
+            return f'{frame.filename}:{frame.lineno}'
+    return '<unknown>'
+
+
+def _plain(obj):
+    '''Strip AuditedArray down to ndarray, recursing into lists, tuples and dicts'''
+    if isinstance(obj, AuditedArray):
+        return obj.view(np.ndarray)
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_plain(x) for x in obj)
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    return obj
+
+
+def _arrays(obj):
+    if isinstance(obj, np.ndarray):
+        yield obj
+    elif isinstance(obj, (list, tuple)):
+        for x in obj:
+            yield from _arrays(x)
+    elif isinstance(obj, dict):
+        for x in obj.values():
+            yield from _arrays(x)
+
+
+def _wrap(result, sources, op, hint=None):
+    '''Record result if it is a new buffer, and keep ndarray results audited'''
+    if isinstance(result, tuple):
+        return tuple(_wrap(r, sources, op, hint) for r in result)
+    if not isinstance(result, np.ndarray) or isinstance(result, np.matrix):
+        return result
+    plain = result.view(np.ndarray) if isinstance(result, AuditedArray) else result
+    if _active is not None and plain.nbytes and \
+            not any(np.may_share_memory(plain, s) for s in sources):
+        _active.record(op, plain, hint)
+    return plain.view(AuditedArray)
+
+
+def _slice_hint(index):
+    '''Hint when an integer or boolean index selects a contiguous evenly spaced run'''
+    if isinstance(index, tuple):
+        for item in index:
+            hint = _slice_hint(item)
+            if hint:
+                return hint
+        return None
+    if not isinstance(index, (np.ndarray, list)):
+        return None
+    index = np.asarray(index)
+    if index.dtype == bool:
+        positions = np.flatnonzero(index)
+        if len(positions) and (np.diff(positions) == 1).all():
+            run = f'{positions[0]}:{positions[-1] + 1}'
+            return f'boolean mask selects one contiguous run; use [{run}] for a view'
+        return None
+    if index.dtype.kind in 'iu' and index.ndim == 1 and len(index) > 1:
+        steps = np.diff(index)
+        if (steps == steps[0]).all() and steps[0] > 0:
+            stop = index[-1] + 1
+            step = '' if steps[0] == 1 else f':{steps[0]}'
+            return f'index is an arithmetic sequence; use [{index[0]}:{stop}{step}] for a view'
+    return None
+
+
+def _audited_conversion(func):
+    '''Wrap an np.asarray-like function to record when it copies a tracked array'''
+    @functools.wraps(func)
+    def wrapper(obj, *args, **kwargs):
+        result = func(obj, *args, **kwargs)
+        if _active is not None and isinstance(obj, AuditedArray) and result.nbytes and \
+                not np.may_share_memory(result, obj):
+            _active.record(f'np.{func.__name__}', result)
+        return result
+    return wrapper
+
+
+def _patch_conversions():
+    for name in _CONVERSIONS:
+        _originals[name] = getattr(np, name)
+        setattr(np, name, _audited_conversion(_originals[name]))
+
+
+def _restore_conversions():
+    for name, func in _originals.items():
+        setattr(np, name, func)
+    _originals.clear()
+
+
+class AuditedArray(np.ndarray):
+    '''ndarray view whose operations are reported to the active CopyAuditor'''
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        plain_inputs = _plain(inputs)
+        if 'out' in kwargs:
+            kwargs['out'] = _plain(kwargs['out'])
+        result = getattr(ufunc, method)(*plain_inputs, **kwargs)
+        sources = list(_arrays(plain_inputs)) + list(_arrays(kwargs.get('out', ())))
+        hint = None
+        if method == '__call__' and 'out' not in kwargs and ufunc.nout == 1:
+            shaped = [x for x in _arrays(plain_inputs)
+                      if x.shape == np.shape(result) and x.dtype == getattr(result, 'dtype', None)]
+            if shaped:
+                hint = f'result matches an input; np.{ufunc.__name__}(..., out=input) avoids it'
+        return _wrap(result, sources, f'np.{ufunc.__name__}', hint)
+
+    def __array_function__(self, func, types, args, kwargs):
+        plain_args, plain_kwargs = _plain(args), _plain(kwargs)
+        result = func(*plain_args, **plain_kwargs)
+        sources = list(_arrays(plain_args)) + list(_arrays(plain_kwargs))
+        return _wrap(result, sources, f'np.{func.__name__}')
+
+    def __getitem__(self, index):
+        plain = self.view(np.ndarray)
+        result = plain[_plain(index)]
+        if not isinstance(result, np.ndarray):
+            return result
+        return _wrap(result, [plain], 'getitem', _slice_hint(_plain(index)))
+
+    def astype(self, dtype, *args, **kwargs):
+        plain = self.view(np.ndarray)
+        hint = None
+        if np.dtype(dtype) == self.dtype and kwargs.get('copy', True):
+            hint = 'astype to the same dtype; pass copy=False'
+        return _wrap(plain.astype(dtype, *args, **kwargs), [plain], 'astype', hint)
+
+    def copy(self, *args, **kwargs):
+        plain = self.view(np.ndarray)
+        return _wrap(plain.copy(*args, **kwargs), [plain], 'copy')
+
+    def reshape(self, *args, **kwargs):
+        plain = self.view(np.ndarray)
+        hint = 'reshape of a non-contiguous array copies; reshape before transposing/slicing'
+        return _wrap(plain.reshape(*args, **kwargs), [plain], 'reshape', hint)
+
+    def flatten(self, *args, **kwargs):
+        plain = self.view(np.ndarray)
+        hint = 'flatten always copies; ravel() returns a view when possible'
+        return _wrap(plain.flatten(*args, **kwargs), [plain], 'flatten', hint)
+
+
+class CopyAuditor:
+    '''
+    Collects a record for every operation on tracked arrays that allocated a new buffer
+
+    Use as a context manager; track() the arrays entering the pipeline and wrap sections in
+    stage(name) to get per-stage totals.
+    '''
+
+    def __init__(self):
+        self.records = []
+        self.current_stage = 'default'
+        self._previous = None
+
+    def __enter__(self):
+        global _active
+        self._previous, _active = _active, self
+        if not _originals:
+            _patch_conversions()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous
+        if _active is None:
+            _restore_conversions()
+        return False
+
+    def track(self, arr):
+        '''Return an audited view of arr (no copy is made)'''
+        return _originals.get('asarray', np.asarray)(arr).view(AuditedArray)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        previous, self.current_stage = self.current_stage, name
+        try:
+            yield self
+        finally:
+            self.current_stage = previous
+
+    def record(self, op, result, hint=None):
+        self.records.append({
+            'stage': self.current_stage,
+            'op': op,
+            'bytes': result.nbytes,
+            'shape': result.shape,
+            'dtype': str(result.dtype),
+            'site': _call_site(),
+            'hint': hint,
+        })
+
+    def by_stage(self):
+        '''Total copies and bytes copied per stage, in first-seen order'''
+        totals = {}
+        for rec in self.records:
+            entry = totals.setdefault(rec['stage'], {'copies': 0, 'bytes': 0, 'flagged': 0})
+            entry['copies'] += 1
+            entry['bytes'] += rec['bytes']
+            entry['flagged'] += rec['hint'] is not None
+        return totals
+
+    def report(self, show_records=True):
+        lines = [f'{"stage":<20}{"copies":>8}{"MB copied":>12}{"flagged":>9}']
+        for stage, entry in self.by_stage().items():
+            lines.append(f'{stage:<20}{entry["copies"]:>8}{entry["bytes"] / 1e6:>12.3f}'
+                         f'{entry["flagged"]:>9}')
+        if show_records:
+            lines.append('')
+            for rec in self.records:
+                lines.append(f'[{rec["stage"]}] {rec["op"]} {rec["shape"]} {rec["dtype"]} '
+                             f'{rec["bytes"]} bytes at {rec["site"]}')
+                if rec['hint']:
+                    lines.append(f'    hint: {rec["hint"]}')
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    names = np.array(['Bob', 'Joe', 'Will', 'Bob', 'Will', 'Joe', 'Joe'])
+    with CopyAuditor() as audit:
+        data = audit.track(np.random.randn(7, 4))
+        with audit.stage('views'):
+            data[2:5]
+            data.T
+        with audit.stage('copies'):
+            data[names == 'Bob']
+            data[[1, 2, 3]]
+            data.astype(np.float64)
+            data * 2
+            np.ascontiguousarray(data.T)
+    print(audit.report())
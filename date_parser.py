@@ -0,0 +1,146 @@
+# date_parser.py
+
+# datetime.strptime('20091031', '%Y%m%d') parses one string into one datetime object. For fixed
+# formats built from the numeric directives below, parse_dates() parses a whole NumPy string or
+# bytes array at once: the characters are viewed as an integer matrix, each field is computed with
+# digit arithmetic over its columns, and the result is a datetime64 array plus a mask of entries
+# that did not match the format. Format analysis is cached, so repeated calls skip it.
+
+from functools import lru_cache
+
+import numpy as np
+
+# Directive -> (field name, width)
+DIRECTIVES = {
+    'Y': ('year', 4),
+    'm': ('month', 2),
+    'd': ('day', 2),
+    'H': ('hour', 2),
+    'M': ('minute', 2),
+    'S': ('second', 2),
+}
+
+# Upper bounds (inclusive) for fields checked without reference to other fields
+FIELD_MAX = {'month': 12, 'hour': 23, 'minute': 59, 'second': 59}
+
+
+@lru_cache(maxsize=128)
+def compile_format(fmt):
+    '''
+    Translate a strptime-style format into a plan
+
+    Returns
+    -------
+    fields : tuple of (field name, start column, width)
+    literals : tuple of (column, character code)
+    length : total number of characters in a matching string
+    '''
+    fields, literals = [], []
+    pos, i = 0, 0
+    while i < len(fmt):
+        if fmt[i] == '%':
+            if i + 1 >= len(fmt):
+                raise ValueError(f'incomplete directive at the end of {fmt!r}')
+            code = fmt[i + 1]
+            if code == '%':
+                literals.append((pos, ord('%')))
+                pos += 1
+            elif code in DIRECTIVES:
+                name, width = DIRECTIVES[code]
+                if any(field[0] == name for field in fields):
+                    raise ValueError(f'directive %{code} appears twice in {fmt!r}')
+                fields.append((name, pos, width))
+                pos += width
+            else:
+                raise ValueError(f'unsupported directive %{code}; supported: '
+                                 + ', '.join('%' + c for c in DIRECTIVES))
+            i += 2
+        else:
+            literals.append((pos, ord(fmt[i])))
+            pos += 1
+            i += 1
+    return tuple(fields), tuple(literals), pos
+
+
+def _char_codes(strings):
+    '''View a 'U' or 'S' array as a 2-dimensional matrix of character codes without copying'''
+    strings = np.ascontiguousarray(strings)
+    if strings.dtype.kind == 'S':
+        return strings.view(np.uint8).reshape(strings.size, strings.itemsize)
+    if strings.dtype.kind == 'U':
+        return strings.view(np.uint32).reshape(strings.size, strings.itemsize // 4)
+    raise TypeError(f'expected a string or bytes array, got dtype {strings.dtype}')
+
+
+def parse_dates(strings, fmt='%Y%m%d'):
+    '''
+    Parse an array of fixed-format date strings
+
+    Parameters
+    ----------
+    strings : ndarray of dtype 'U' or 'S' (lists are converted with np.asarray)
+    fmt : format made of %Y, %m, %d, %H, %M, %S, %% and literal characters
+
+    Returns
+    -------
+    dates : datetime64[D] array (datetime64[s] if fmt has time fields), NaT where invalid
+    invalid : boolean array marking entries that did not parse
+    '''
+    strings = np.asarray(strings)
+    shape = strings.shape
+    fields, literals, length = compile_format(fmt)
+    codes = _char_codes(strings.reshape(-1))
+    n = codes.shape[0]
+
+    if codes.shape[1] < length:
+        # No entry is long enough to match the format
+        codes = np.zeros((n, length), dtype=codes.dtype)
+        valid = np.zeros(n, dtype=bool)
+    else:
+        # Anything after the formatted characters must be padding
+        valid = (codes[:, length:] == 0).all(axis=1)
+
+    for column, code in literals:
+        valid &= codes[:, column] == code
+
+    values = {}
+    for name, start, width in fields:
+        digits = codes[:, start:start + width].astype(np.int64) - ord('0')
+        valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+        values[name] = digits @ (10 ** np.arange(width - 1, -1, -1, dtype=np.int64))
+
+    year = values.get('year', np.full(n, 1900, dtype=np.int64))
+    month = values.get('month', np.ones(n, dtype=np.int64))
+    day = values.get('day', np.ones(n, dtype=np.int64))
+    for name, high in FIELD_MAX.items():
+        if name in values:
+            valid &= values[name] <= high
+    # strptime has no year 0
+    valid &= (month >= 1) & (day >= 1) & (year >= 1)
+
+    # Clamp invalid months so the datetime arithmetic below stays in range, then check the day
+    month = np.where(valid, month, 1)
+    month_start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]')
+                     - month_start.astype('datetime64[D]')).astype(np.int64)
+    valid &= day <= days_in_month
+
+    dates = month_start.astype('datetime64[D]') + (day - 1)
+    if any(name in values for name in ('hour', 'minute', 'second')):
+        seconds = (values.get('hour', 0) * 3600 + values.get('minute', 0) * 60
+                   + values.get('second', 0))
+        dates = dates.astype('datetime64[s]') + seconds
+
+    dates[~valid] = np.datetime64('NaT')
+    return dates.reshape(shape), ~valid.reshape(shape)
+
+
+if __name__ == '__main__':
+    from datetime import datetime
+
+    dates, invalid = parse_dates(np.array(['20091031', '20090229', 'not_date']))
+    print(dates, invalid)
+    assert dates[0] == np.datetime64(datetime.strptime('20091031', '%Y%m%d'))
+
+    dates, invalid = parse_dates(np.array([b'10/29/2011 20:30']), '%m/%d/%Y %H:%M')
+    print(dates, invalid)
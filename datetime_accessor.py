@@ -0,0 +1,193 @@
+# datetime_accessor.py
+
+# dt.day, dt.minute, dt.date(), dt.replace(minute=0, second=0), dt2 - dt and dt.strftime() all
+# work on one datetime object at a time. DatetimeArray provides the same operations over a whole
+# datetime64 array using only unit conversions and integer arithmetic, so no datetime objects are
+# ever created. strftime() writes into a preallocated string buffer using the same format plans
+# as date_parser.parse_dates().
+
+import numpy as np
+
+from date_parser import compile_format
+
+# Units accepted by floor(), from coarsest to finest
+FLOOR_UNITS = ('Y', 'M', 'D', 'h', 'm', 's', 'ms', 'us', 'ns')
+
+
+class DatetimeArray:
+    '''
+    Vectorized datetime fields and arithmetic over a datetime64 array
+
+    Parameters
+    ----------
+    values : datetime64 array (or anything np.asarray can turn into one)
+    '''
+
+    def __init__(self, values):
+        values = np.asarray(values)
+        if values.dtype.kind != 'M':
+            values = values.astype('datetime64[s]')
+        self.values = values
+
+    def __repr__(self):
+        return f'DatetimeArray({self.values!r})'
+
+    def __len__(self):
+        return len(self.values)
+
+    def _as(self, unit):
+        return self.values.astype(f'datetime64[{unit}]')
+
+    def isnat(self):
+        return np.isnat(self.values)
+
+    # Components --------------------------------------------------------------------------------
+
+    @property
+    def year(self):
+        return self._as('Y').astype(np.int64) + 1970
+
+    @property
+    def month(self):
+        return (self._as('M') - self._as('Y')).astype(np.int64) + 1
+
+    @property
+    def day(self):
+        return (self._as('D') - self._as('M')).astype(np.int64) + 1
+
+    @property
+    def hour(self):
+        return (self._as('h') - self._as('D')).astype(np.int64)
+
+    @property
+    def minute(self):
+        return (self._as('m') - self._as('h')).astype(np.int64)
+
+    @property
+    def second(self):
+        return (self._as('s') - self._as('m')).astype(np.int64)
+
+    @property
+    def microsecond(self):
+        return (self._as('us') - self._as('s')).astype(np.int64)
+
+    @property
+    def weekday(self):
+        '''Monday is 0 and Sunday is 6, like datetime.weekday()'''
+        # 1970-01-01 was a Thursday
+        return (self._as('D').astype(np.int64) + 3) % 7
+
+    def date(self):
+        '''Equivalent of dt.date(): the datetime64[D] part'''
+        return self._as('D')
+
+    def time(self):
+        '''Equivalent of dt.time(): the offset since midnight as timedelta64'''
+        return self.values - self._as('D')
+
+    # Truncation --------------------------------------------------------------------------------
+
+    def floor(self, unit):
+        '''
+        Truncate to the start of the given unit, keeping the original resolution. For example
+        floor('h') matches dt.replace(minute=0, second=0, microsecond=0).
+        '''
+        if unit not in FLOOR_UNITS:
+            raise ValueError(f'unit must be one of {FLOOR_UNITS}')
+        return DatetimeArray(self._as(unit).astype(self.values.dtype))
+
+    def replace(self, year=None, month=None, day=None, hour=None, minute=None, second=None):
+        '''
+        Vectorized dt.replace(): each given field (a scalar or an array) replaces that component.
+        Where dt.replace() would raise (a month outside 1-12, an hour outside 0-23, a minute or
+        second outside 0-59, or a day that does not exist in the resulting month) the result is
+        NaT instead of rolling over into the next month, day or minute.
+        '''
+        year = self.year if year is None else np.asarray(year)
+        month = self.month if month is None else np.asarray(month)
+        day = self.day if day is None else np.asarray(day)
+        hour = self.hour if hour is None else np.asarray(hour)
+        minute = self.minute if minute is None else np.asarray(minute)
+        second = self.second if second is None else np.asarray(second)
+
+        month_start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+        days = month_start.astype('datetime64[D]') + (day - 1)
+        invalid = ((days.astype('datetime64[M]') != month_start) | (month < 1) | (month > 12)
+                   | (hour < 0) | (hour > 23) | (minute < 0) | (minute > 59)
+                   | (second < 0) | (second > 59))
+        seconds = hour * 3600 + minute * 60 + second
+        sub_second = self.values - self._as('s')
+        result = (days.astype('datetime64[s]') + seconds).astype(self.values.dtype) + sub_second
+        result = np.where(invalid | self.isnat(), np.datetime64('NaT'), result)
+        return DatetimeArray(result.astype(self.values.dtype))
+
+    # Arithmetic --------------------------------------------------------------------------------
+
+    def diff(self, other):
+        '''Elementwise self - other as timedelta64 (the dt2 - dt equivalent)'''
+        other = other.values if isinstance(other, DatetimeArray) else np.asarray(other)
+        return self.values - other
+
+    def shift(self, delta):
+        '''Add a timedelta64 (scalar or array) to every element'''
+        return DatetimeArray(self.values + delta)
+
+    def __sub__(self, other):
+        if isinstance(other, DatetimeArray) or np.asarray(other).dtype.kind == 'M':
+            return self.diff(other)
+        return self.shift(-np.asarray(other))
+
+    def __add__(self, delta):
+        return self.shift(delta)
+
+    # Formatting --------------------------------------------------------------------------------
+
+    def strftime(self, fmt='%Y-%m-%d %H:%M:%S', out=None):
+        '''
+        Format every element into a fixed-width string buffer
+
+        Parameters
+        ----------
+        fmt : format made of %Y, %m, %d, %H, %M, %S, %% and literal characters
+        out : optional preallocated 'S' or 'U' array with the same size and at least as many
+              characters as the formatted width; a new bytes array is created otherwise
+
+        Returns
+        -------
+        out : the filled string array; NaT entries become 'NaT'
+        '''
+        fields, literals, length = compile_format(fmt)
+        if out is None:
+            out = np.zeros(self.values.shape, dtype=f'S{length}')
+        if out.size != self.values.size or out.dtype.kind not in 'SU':
+            raise ValueError('out must be a string or bytes array of the same size')
+
+        code_type = np.uint8 if out.dtype.kind == 'S' else np.uint32
+        width = out.itemsize // np.dtype(code_type).itemsize
+        if width < length:
+            raise ValueError(f'out holds {width} characters per entry, {length} are needed')
+        codes = out.reshape(-1).view(code_type).reshape(out.size, width)
+        codes[:, length:] = 0
+
+        for column, code in literals:
+            codes[:, column] = code
+        for name, start, field_width in fields:
+            value = getattr(self, name).reshape(-1)
+            for k in range(field_width):
+                codes[:, start + k] = (value // 10 ** (field_width - 1 - k)) % 10 + ord('0')
+
+        nat = self.isnat().reshape(-1)
+        if nat.any():
+            codes[nat] = 0
+            codes[nat, :min(3, width)] = [ord(c) for c in 'NaT'[:width]]
+        return out
+
+
+if __name__ == '__main__':
+    dt = DatetimeArray(np.array(['2011-10-29T20:30:21', '2011-11-15T22:30:00'],
+                                dtype='datetime64[s]'))
+    print(dt.day, dt.minute, dt.date(), dt.time())
+    print(dt.floor('h').values)
+    print(dt.replace(minute=0, second=0).values)
+    print(dt.diff(dt.values[0]))
+    print(dt.strftime('%m/%d/%Y %H:%M'))
@@ -0,0 +1,144 @@
+# decimate.py
+
+# plt.plot(np.random.randn(50).cumsum()) is fine for 50 points, but with 10^8 points matplotlib
+# spends its time drawing many points onto the same pixel. The functions here reduce a series to
+# about two points per horizontal pixel before plotting: minmax_decimate() keeps the minimum and
+# maximum of each bucket, so the drawn envelope is unchanged, and lttb_decimate() implements
+# Largest-Triangle-Three-Buckets for smoother-looking line plots. Both work on ndarrays and memory
+# maps, reading the input one block of buckets at a time. plot_large() decimates and renders to a
+# file with the Agg backend, so it runs headless.
+
+import numpy as np
+
+# Input elements read per block when decimating
+BLOCK_SIZE = 1 << 22
+
+
+def _bucket_edges(n, n_buckets):
+    return np.linspace(0, n, n_buckets + 1).astype(np.int64)
+
+
+def minmax_decimate(y, n_buckets, block_size=BLOCK_SIZE):
+    '''
+    Keep the minimum and maximum of each of n_buckets equal-width buckets
+
+    Returns
+    -------
+    index : positions of the kept points in y, in increasing order
+    values : y[index]
+    '''
+    if not isinstance(y, np.ndarray):
+        y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n), np.asarray(y[:])
+
+    edges = _bucket_edges(n, n_buckets)
+    lo_index = np.empty(n_buckets, dtype=np.int64)
+    hi_index = np.empty(n_buckets, dtype=np.int64)
+
+    # Process whole buckets a block at a time so a memory map is read sequentially once
+    buckets_per_block = max(1, block_size * n_buckets // n)
+    for first in range(0, n_buckets, buckets_per_block):
+        last = min(first + buckets_per_block, n_buckets)
+        start, stop = edges[first], edges[last]
+        block = np.asarray(y[start:stop])
+        local_edges = edges[first:last] - start
+        # reduceat gives per-bucket extremes; recover their positions by matching within buckets.
+        # fmin/fmax skip NaN gaps; a bucket that is all NaN keeps its first NaN, so the gap shows.
+        lows = np.fmin.reduceat(block, local_edges)
+        highs = np.fmax.reduceat(block, local_edges)
+        bucket = np.repeat(np.arange(last - first), np.diff(edges[first:last + 1]))
+        position = np.arange(stop - start)
+        nan = np.isnan(block) if block.dtype.kind in 'fc' else None
+        for extreme, out in ((lows, lo_index), (highs, hi_index)):
+            hit = block == extreme[bucket]
+            if nan is not None:
+                hit |= nan & np.isnan(extreme)[bucket]
+            match = np.flatnonzero(hit)
+            # First match within each bucket
+            first_match = match[np.unique(bucket[match], return_index=True)[1]]
+            out[first:last] = position[first_match] + start
+
+    index = np.sort(np.concatenate([lo_index, hi_index]))
+    index = index[np.concatenate([[True], np.diff(index) > 0])]
+    return index, np.asarray(y[index])
+
+
+def lttb_decimate(y, n_out, x=None):
+    '''
+    Largest-Triangle-Three-Buckets downsampling to n_out points
+
+    Returns
+    -------
+    index : positions of the kept points in y, in increasing order
+    values : y[index]
+    '''
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n), np.asarray(y[:])
+
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    # First and last points are always kept; the rest are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    index = np.empty(n_out, dtype=np.int64)
+    index[0], index[-1] = 0, n - 1
+
+    previous = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        next_stop = edges[b + 2] if b + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = np.asarray(y[stop:next_stop], dtype=np.float64).mean()
+
+        px, py = x[previous], float(y[previous])
+        bx, by = x[start:stop], np.asarray(y[start:stop], dtype=np.float64)
+        area = np.abs((px - next_x) * (by - py) - (px - bx) * (next_y - py))
+        previous = start + int(area.argmax())
+        index[b + 1] = previous
+
+    return index, np.asarray(y[index])
+
+
+def plot_large(y, path, width=1200, height=400, dpi=100, method='minmax', x=None, **plot_kwargs):
+    '''
+    Decimate y to about two points per pixel of the figure width and render it with Agg
+
+    Parameters
+    ----------
+    y : ndarray or memmap to plot
+    path : output image file (format taken from the extension)
+    width, height : figure size in pixels
+    method : 'minmax' or 'lttb'
+    x : optional x values (defaults to positions)
+    plot_kwargs : passed to Axes.plot
+
+    Returns
+    -------
+    n_points : number of points actually drawn
+    '''
+    # Figure + FigureCanvasAgg renders without touching pyplot's global backend
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    if method == 'minmax':
+        index, values = minmax_decimate(y, width)
+    elif method == 'lttb':
+        index, values = lttb_decimate(y, 2 * width, x)
+    else:
+        raise ValueError("method must be 'minmax' or 'lttb'")
+    xs = index if x is None else np.asarray(x)[index]
+
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(xs, values, **plot_kwargs)
+    fig.savefig(path)
+    return len(index)
+
+
+if __name__ == '__main__':
+    series = np.random.randn(10_000_000).cumsum()
+    index, values = minmax_decimate(series, 1000)
+    assert values.max() == series.max() and values.min() == series.min()
+    print(len(series), '->', len(index), 'points')
@@ -0,0 +1,154 @@
+# dtype_optimizer.py
+
+# np.array() infers int64 or float64 by default, which is often twice the size the data needs.
+# Instead of picking a smaller type by hand with astype(np.int32), smallest_dtype() scans an array
+# and finds the smallest integer or float dtype that holds it losslessly (or within a relative
+# tolerance for floats), and downcast() performs the cast chunk by chunk so that peak memory is the
+# original array plus the smaller result, never two full-size copies. Chunks are views taken in
+# the array's own memory order (row blocks for arrays that are neither C- nor Fortran-contiguous),
+# so nothing is flattened into a copy first, and the result keeps the input's memory layout.
+
+import numpy as np
+
+SIGNED_INTS = [np.int8, np.int16, np.int32, np.int64]
+UNSIGNED_INTS = [np.uint8, np.uint16, np.uint32, np.uint64]
+FLOATS = [np.float16, np.float32, np.float64]
+
+# Elements processed per chunk when scanning and casting
+CHUNK_SIZE = 1 << 20
+
+
+def _chunks(arrays, chunk_size):
+    '''
+    Matching views of about chunk_size elements covering arrays of the same shape and layout as
+    arrays[0], in its memory order and without copying
+    '''
+    first = arrays[0]
+    if first.flags.f_contiguous and not first.flags.c_contiguous:
+        arrays = [x.T for x in arrays]
+    if arrays[0].flags.c_contiguous:
+        flats = [x.reshape(-1) for x in arrays]
+        for start in range(0, first.size, chunk_size):
+            yield [x[start:start + chunk_size] for x in flats]
+        return
+    rows = max(chunk_size // max(first[:1].size, 1), 1)
+    for start in range(0, first.shape[0], rows):
+        yield [x[start:start + rows] for x in arrays]
+
+
+def _fits_float(arr, dtype, float_tol, chunk_size):
+    with np.errstate(over='ignore', invalid='ignore'):
+        for chunk, in _chunks([arr], chunk_size):
+            cast = chunk.astype(dtype).astype(chunk.dtype)
+            same = (cast == chunk) | (np.isnan(cast) & np.isnan(chunk))
+            if float_tol:
+                same |= np.abs(cast - chunk) <= float_tol * np.abs(chunk)
+            if not same.all():
+                return False
+    return True
+
+
+def smallest_dtype(arr, float_tol=0.0, allow_unsigned=False, chunk_size=CHUNK_SIZE):
+    '''
+    Find the smallest dtype of the same kind that can hold arr
+
+    Parameters
+    ----------
+    arr : ndarray of integers or floats
+    float_tol : maximum relative error accepted when narrowing floats (0 means lossless)
+    allow_unsigned : whether non-negative signed integer data may become an unsigned type
+                     (unsigned data may always stay unsigned)
+
+    Returns
+    -------
+    dtype : numpy dtype (arr.dtype itself when nothing smaller fits)
+    '''
+    arr = np.asarray(arr)
+    if arr.size == 0:
+        return arr.dtype
+
+    kind = arr.dtype.kind
+    if kind in 'iu':
+        low, high = arr.min(), arr.max()
+        # Unsigned input keeps its own kind; signed input may switch only when allowed
+        candidates = SIGNED_INTS
+        if kind == 'u' or (allow_unsigned and low >= 0):
+            candidates = UNSIGNED_INTS + SIGNED_INTS
+        candidates = sorted(candidates, key=lambda t: np.dtype(t).itemsize)
+        for dtype in candidates:
+            if np.dtype(dtype).itemsize >= arr.itemsize:
+                break
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return np.dtype(dtype)
+    elif kind == 'f':
+        for dtype in FLOATS:
+            if np.dtype(dtype).itemsize >= arr.itemsize:
+                break
+            if _fits_float(arr, dtype, float_tol, chunk_size):
+                return np.dtype(dtype)
+    return arr.dtype
+
+
+def downcast(arr, dtype=None, float_tol=0.0, allow_unsigned=False, chunk_size=CHUNK_SIZE):
+    '''
+    Cast arr to dtype (or to smallest_dtype(arr) when dtype is None) one chunk at a time
+
+    Returns
+    -------
+    result : ndarray with the new dtype and arr's memory order (arr itself if the dtype does not
+             change)
+    report : dict with the old and new dtypes and the bytes saved
+    '''
+    arr = np.asarray(arr)
+    if dtype is None:
+        dtype = smallest_dtype(arr, float_tol, allow_unsigned, chunk_size)
+    dtype = np.dtype(dtype)
+
+    if dtype == arr.dtype:
+        result = arr
+    else:
+        result = np.empty_like(arr, dtype=dtype)
+        for src, dst in _chunks([arr, result], chunk_size):
+            dst[...] = src
+
+    report = {
+        'from': arr.dtype,
+        'to': result.dtype,
+        'bytes_before': arr.nbytes,
+        'bytes_after': result.nbytes,
+        'bytes_saved': arr.nbytes - result.nbytes,
+    }
+    return result, report
+
+
+def optimize_arrays(arrays, float_tol=0.0, allow_unsigned=False, chunk_size=CHUNK_SIZE):
+    '''
+    Downcast every array in a dict of named arrays
+
+    Entries of the input dict are replaced one at a time so that only one original array needs to
+    coexist with its smaller copy.
+
+    Returns
+    -------
+    arrays : the same dict, holding the downcast arrays
+    report : dict mapping each name to its downcast() report, plus a 'total_bytes_saved' entry
+    '''
+    report = {}
+    for name in list(arrays):
+        arrays[name], report[name] = downcast(arrays[name], None, float_tol, allow_unsigned,
+                                              chunk_size)
+    report['total_bytes_saved'] = sum(r['bytes_saved'] for r in report.values())
+    return arrays, report
+
+
+if __name__ == '__main__':
+    data = {
+        'ints': np.arange(10),
+        'calibers': np.array([.22, .270, .357, .380, .44, .50]),
+        'halves': np.array([1.5, 2.25, -8.0]),
+    }
+    data, report = optimize_arrays(data, float_tol=1e-6)
+    for name, arr in data.items():
+        print(name, arr.dtype)
+    print('bytes saved:', report['total_bytes_saved'])
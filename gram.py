@@ -0,0 +1,173 @@
+# gram.py
+
+# np.dot(arr.T, arr) needs the whole array in memory. GramAccumulator builds the same X^T X matrix
+# from row chunks, so a design matrix stored on disk (.npy or raw binary) can be streamed through
+# a memory map. Only the upper triangle is computed for each chunk, column sums and row counts are
+# kept alongside so means and the covariance come out of the same pass, and the running state can
+# be checkpointed to disk and resumed.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class GramAccumulator:
+    '''
+    Running X^T X, column sums and row count for a matrix with n_cols columns
+
+    Parameters
+    ----------
+    n_cols : number of columns of the matrix being accumulated
+    block_cols : width of the column blocks used for the upper-triangle products
+    '''
+
+    def __init__(self, n_cols, block_cols=256):
+        self.n_cols = n_cols
+        self.block_cols = block_cols
+        self.upper = np.zeros((n_cols, n_cols))
+        self.sums = np.zeros(n_cols)
+        self.count = 0
+
+    def update(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.ndim != 2 or chunk.shape[1] != self.n_cols:
+            raise ValueError(f'expected a chunk with {self.n_cols} columns, got {chunk.shape}')
+
+        b = self.block_cols
+        for i in range(0, self.n_cols, b):
+            left = chunk[:, i:i + b]
+            for j in range(i, self.n_cols, b):
+                self.upper[i:i + b, j:j + b] += left.T @ chunk[:, j:j + b]
+
+        self.sums += chunk.sum(axis=0)
+        self.count += chunk.shape[0]
+        return self
+
+    def reset(self):
+        '''Zero the running state in place, keeping the allocated matrix'''
+        self.upper[:] = 0
+        self.sums[:] = 0
+        self.count = 0
+        return self
+
+    def merge(self, other):
+        if other.n_cols != self.n_cols:
+            raise ValueError('cannot merge accumulators with different column counts')
+        self.upper += other.upper
+        self.sums += other.sums
+        self.count += other.count
+        return self
+
+    def gram(self):
+        '''Full symmetric X^T X, mirrored from the accumulated upper triangle'''
+        return np.triu(self.upper) + np.triu(self.upper, 1).T
+
+    def mean(self):
+        return self.sums / self.count
+
+    def covariance(self, ddof=1):
+        mean = self.mean()
+        return (self.gram() - self.count * np.outer(mean, mean)) / (self.count - ddof)
+
+    def save(self, path, rows_done=None):
+        '''Write the running state to an .npz checkpoint (atomically replacing any old one)'''
+        rows_done = self.count if rows_done is None else rows_done
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, upper=self.upper, sums=self.sums, count=self.count,
+                 rows_done=rows_done, block_cols=self.block_cols)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        '''Restore an accumulator from a checkpoint, returning (accumulator, rows_done)'''
+        with np.load(path) as state:
+            acc = cls(state['upper'].shape[0], int(state['block_cols']))
+            acc.upper[:] = state['upper']
+            acc.sums[:] = state['sums']
+            acc.count = int(state['count'])
+            rows_done = int(state['rows_done'])
+        return acc, rows_done
+
+
+def open_matrix(path, dtype=None, n_cols=None):
+    '''
+    Memory-map a 2-dimensional matrix from an .npy file, or from a raw binary file when dtype and
+    n_cols are given
+    '''
+    if dtype is None:
+        arr = np.load(path, mmap_mode='r')
+    else:
+        if n_cols is None:
+            raise ValueError('n_cols is required for raw binary files')
+        arr = np.memmap(path, dtype=dtype, mode='r').reshape(-1, n_cols)
+    if arr.ndim != 2:
+        raise ValueError('expected a 2-dimensional matrix')
+    return arr
+
+
+def accumulate_gram(source, chunk_rows=65536, n_threads=None, block_cols=256, checkpoint=None,
+                    checkpoint_every=16, dtype=None, n_cols=None):
+    '''
+    Stream X^T X over the rows of a matrix
+
+    Parameters
+    ----------
+    source : ndarray, memmap or path to an .npy / raw binary file
+    chunk_rows : rows read per chunk
+    n_threads : number of worker threads (defaults to the CPU count); each keeps one
+                n_cols x n_cols accumulator for the whole run
+    block_cols : column block width for the upper-triangle products
+    checkpoint : optional .npz path; resumed from if it exists, rewritten as work progresses
+    checkpoint_every : number of chunks between checkpoint writes
+    dtype, n_cols : layout of a raw binary source
+
+    Returns
+    -------
+    acc : GramAccumulator (use acc.gram(), acc.mean(), acc.covariance())
+    '''
+    if isinstance(source, (str, os.PathLike)):
+        source = open_matrix(source, dtype, n_cols)
+    n_rows, n_cols = source.shape
+
+    if checkpoint is not None and os.path.exists(checkpoint):
+        acc, start = GramAccumulator.load(checkpoint)
+    else:
+        acc, start = GramAccumulator(n_cols, block_cols), 0
+
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+
+    # One accumulator per worker, reused for every chunk it processes, so memory stays at
+    # n_threads + 1 Gram matrices however many chunks are in flight
+    n_workers = max(min(n_threads, -(-(n_rows - start) // chunk_rows)), 1)
+    workers = [GramAccumulator(n_cols, block_cols) for _ in range(n_workers)]
+
+    # Work proceeds in rounds of chunks so the checkpoint always marks a contiguous prefix of rows;
+    # the workers' partial sums are merged into acc at the end of every round
+    round_rows = chunk_rows * max(checkpoint_every, n_workers)
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        for round_start in range(start, n_rows, round_rows):
+            round_stop = min(round_start + round_rows, n_rows)
+            chunk_starts = range(round_start, round_stop, chunk_rows)
+
+            def work(w):
+                for lo in chunk_starts[w::n_workers]:
+                    workers[w].update(source[lo:min(lo + chunk_rows, round_stop)])
+
+            list(pool.map(work, range(n_workers)))
+            for worker in workers:
+                acc.merge(worker)
+                worker.reset()
+            if checkpoint is not None:
+                acc.save(checkpoint, rows_done=round_stop)
+
+    return acc
+
+
+if __name__ == '__main__':
+    arr = np.random.randn(6, 3)
+    acc = accumulate_gram(arr, chunk_rows=2)
+    assert np.allclose(acc.gram(), np.dot(arr.T, arr))
+    assert np.allclose(acc.covariance(), np.cov(arr, rowvar=False))
+    print(acc.gram())
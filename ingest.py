@@ -0,0 +1,133 @@
+# ingest.py
+
+# np.array(data1) copies its input and infers the dtype element by element, whatever the input is.
+# ingest() looks at the input's type first and takes the cheapest route into an ndarray: existing
+# arrays and anything exposing the buffer protocol (bytes, bytearray, memoryview, array.array,
+# mmap) are wrapped without copying, iterators and generators of known length are written into a
+# preallocated array in one typed pass with np.fromiter, ranges become np.arange, and only nested
+# sequences go through np.array. The route chosen for each type is cached, and every call reports
+# whether it copied. A requested dtype always converts values (bytes b'\x01\x02' with
+# dtype=np.int64 gives [1, 2]); use np.frombuffer to reinterpret raw bytes as another type.
+
+import array
+import operator
+from collections.abc import Iterator
+
+import numpy as np
+
+# Handler chosen for each input type, filled in on first use
+_HANDLERS = {}
+
+
+def _from_ndarray(obj, dtype, length):
+    result = obj if dtype is None else obj.astype(dtype, copy=False)
+    return result, result is not obj and not np.shares_memory(result, obj)
+
+
+def _from_buffer(obj, dtype, length):
+    # memoryview carries the format and shape, which np.asarray turns into dtype and shape
+    result = np.asarray(memoryview(obj))
+    if dtype is not None and result.dtype != dtype:
+        return result.astype(dtype), True
+    return result, False
+
+
+def _from_array_module(obj, dtype, length):
+    # array.array's numeric typecodes are NumPy dtype codes; its character typecodes hold one
+    # code point per item, which is NumPy's 'U1' when stored as UCS-4
+    typecode = obj.typecode
+    if typecode in 'uw':
+        if obj.itemsize != 4:
+            # 2-byte wchar_t (Windows) is UTF-16, which has no NumPy equivalent
+            result = np.array(list(obj.tounicode()), dtype='U1')
+            return (result if dtype is None else result.astype(dtype)), True
+        typecode = 'U1'
+    result = np.frombuffer(obj, dtype=typecode) if len(obj) else np.array([], typecode)
+    if dtype is not None and result.dtype != dtype:
+        return result.astype(dtype), True
+    return result, False
+
+
+def _from_iterator(obj, dtype, length):
+    if length is None:
+        length = operator.length_hint(obj, -1)
+    dtype = np.float64 if dtype is None else dtype
+    return np.fromiter(obj, dtype=dtype, count=length), True
+
+
+def _from_range(obj, dtype, length):
+    return np.arange(obj.start, obj.stop, obj.step, dtype=dtype), True
+
+
+def _from_sequence(obj, dtype, length):
+    return np.array(obj, dtype=dtype), True
+
+
+def _resolve_handler(cls):
+    if issubclass(cls, np.ndarray):
+        return _from_ndarray
+    if issubclass(cls, array.array):
+        return _from_array_module
+    if issubclass(cls, Iterator):
+        return _from_iterator
+    if issubclass(cls, range):
+        return _from_range
+    if hasattr(cls, '__buffer__') or cls in (bytes, bytearray, memoryview):
+        return _from_buffer
+    return None
+
+
+def _handler(obj):
+    cls = type(obj)
+    handler = _HANDLERS.get(cls)
+    if handler is None:
+        handler = _resolve_handler(cls)
+        if handler is None:
+            # Types implementing the buffer protocol in C don't always advertise it, so probe
+            try:
+                memoryview(obj)
+                handler = _from_buffer
+            except TypeError:
+                handler = _from_sequence
+        _HANDLERS[cls] = handler
+    return handler
+
+
+def ingest(obj, dtype=None, length=None):
+    '''
+    Turn obj into an ndarray, avoiding copies wherever the input type allows
+
+    Parameters
+    ----------
+    obj : ndarray, buffer-protocol object, array.array, iterator/generator, or nested sequence
+    dtype : optional target dtype; values are converted, never reinterpreted (iterators default
+            to float64)
+    length : number of items an iterator will yield, if not available from len()/length_hint
+
+    Returns
+    -------
+    arr : ndarray
+    copied : False when arr shares memory with obj, True when the data was copied
+    '''
+    if dtype is not None:
+        dtype = np.dtype(dtype)
+    return _handler(obj)(obj, dtype, length)
+
+
+def clear_cache():
+    '''Forget the per-type dispatch decisions'''
+    _HANDLERS.clear()
+
+
+if __name__ == '__main__':
+    data1 = [6, 7.5, 8, 0, 1]
+    arr1, copied = ingest(data1)
+    print(arr1, copied)
+
+    values = array.array('d', data1)
+    arr2, copied = ingest(values)
+    arr2[0] = -1
+    print(values[0], copied)
+
+    arr3, copied = ingest((x ** 2 for x in range(5)), dtype=np.int64, length=5)
+    print(arr3, copied)
@@ -0,0 +1,214 @@
+# latency.py
+
+# '%timeit f(1, 2, 3)' measures a function interactively, once. The instrument() decorator keeps
+# measuring in production: every call is counted, and a sample of calls (every Nth) is timed into
+# a fixed-size log-linear latency histogram in the style of HdrHistogram, so memory does not grow
+# with the number of calls. Statistics live in a registry that can be dumped as JSON or reset
+# while the program runs:
+#
+# @instrument(sample_every=1000)
+# def clean_strings(strings, ops):
+#     ...
+#
+# instrument_attribute(some_module, 'f')
+# print(dump_json())
+#
+# Overhead: the Python-level wrapper costs a few hundred nanoseconds on every call (0.3-0.5 us
+# measured on attempt_float, a 0.2 us function), sampled or not; a timed call costs about as much
+# again. With the default of timing one call in 100, that keeps overhead near 1% for functions
+# taking 30-50 us or more: request handlers, per-chunk or per-file processing. It is not suited to
+# sub-microsecond functions called in tight loops; instrument the loop's caller instead.
+
+import functools
+import json
+import threading
+import time
+
+
+class LatencyHistogram:
+    '''
+    Fixed-memory latency histogram with log-linear buckets
+
+    Values below 2 ** sub_bucket_bits nanoseconds are counted exactly; above that every power of
+    two is split into 2 ** (sub_bucket_bits - 1) buckets, so each bucket's width is at most
+    2 / 2 ** sub_bucket_bits of its value (about 6% with the default of 5 bits).
+    '''
+
+    def __init__(self, sub_bucket_bits=5):
+        self.sub_bits = sub_bucket_bits
+        self.half = 1 << (sub_bucket_bits - 1)
+        self.counts = [0] * ((1 << sub_bucket_bits) + (64 - sub_bucket_bits) * self.half)
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value):
+        shift = value.bit_length() - self.sub_bits
+        if shift <= 0:
+            return value
+        return (1 << self.sub_bits) + (shift - 1) * self.half + (value >> shift) - self.half
+
+    def _lower_bound(self, index):
+        if index < (1 << self.sub_bits):
+            return index
+        shift, offset = divmod(index - (1 << self.sub_bits), self.half)
+        return (offset + self.half) << (shift + 1)
+
+    def record(self, value_ns):
+        self.counts[self._index(value_ns)] += 1
+        self.total += 1
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def percentile(self, q):
+        '''Lower bound of the bucket holding the q-th percentile (0-100), in nanoseconds'''
+        if not self.total:
+            return 0
+        rank = max(1, round(q / 100 * self.total))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._lower_bound(index), self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.max = 0
+
+
+class CallStats:
+    '''Call count plus sampled latencies for one instrumented function'''
+
+    def __init__(self, name, sample_every):
+        self.name = name
+        self.sample_every = sample_every
+        self.calls = 0
+        self.errors = 0
+        self.sampled_ns = 0
+        self.histogram = LatencyHistogram()
+
+    def summary(self):
+        sampled = self.histogram.total
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'sample_every': self.sample_every,
+            'sampled': sampled,
+            'mean_us': self.sampled_ns / sampled / 1000 if sampled else None,
+            'p50_us': self.histogram.percentile(50) / 1000,
+            'p90_us': self.histogram.percentile(90) / 1000,
+            'p99_us': self.histogram.percentile(99) / 1000,
+            'max_us': self.histogram.max / 1000,
+        }
+
+    def reset(self):
+        self.calls = self.errors = self.sampled_ns = 0
+        self.histogram.reset()
+
+
+# Time one call in this many unless a function asks otherwise
+DEFAULT_SAMPLE_EVERY = 100
+
+# Name -> CallStats for every instrumented function
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+def _stats_for(name, sample_every):
+    with _registry_lock:
+        stats = REGISTRY.get(name)
+        if stats is None:
+            stats = REGISTRY[name] = CallStats(name, sample_every)
+        return stats
+
+
+def instrument(func=None, *, name=None, sample_every=DEFAULT_SAMPLE_EVERY):
+    '''
+    Decorator counting every call and error and timing every sample_every-th call
+
+    Can be used bare (@instrument) or with options (@instrument(sample_every=1000)). Errors are
+    counted on every call; latency only on sampled ones.
+    '''
+    if func is None:
+        return functools.partial(instrument, name=name, sample_every=sample_every)
+
+    stats = _stats_for(name or f'{func.__module__}.{func.__qualname__}', sample_every)
+    perf_counter_ns = time.perf_counter_ns
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats.calls += 1
+        if stats.calls % sample_every:
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                stats.errors += 1
+                raise
+        start = perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = perf_counter_ns() - start
+            stats.sampled_ns += elapsed
+            stats.histogram.record(elapsed)
+
+    wrapper.stats = stats
+    return wrapper
+
+
+def instrument_attribute(owner, attr, sample_every=DEFAULT_SAMPLE_EVERY):
+    '''Replace owner.attr (e.g. some_module.f) with an instrumented version of itself'''
+    func = getattr(owner, attr)
+    name = f'{getattr(owner, "__name__", type(owner).__name__)}.{attr}'
+    wrapped = instrument(func, name=name, sample_every=sample_every)
+    setattr(owner, attr, wrapped)
+    return wrapped
+
+
+def snapshot():
+    '''Summaries of every instrumented function, keyed by name'''
+    return {name: stats.summary() for name, stats in sorted(REGISTRY.items())}
+
+
+def dump_json(path=None, indent=2):
+    '''Return the snapshot as JSON, also writing it to path if one is given'''
+    text = json.dumps(snapshot(), indent=indent)
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(text)
+    return text
+
+
+def reset(name=None):
+    '''Clear the statistics of one function, or of all of them'''
+    for stats in ([REGISTRY[name]] if name is not None else list(REGISTRY.values())):
+        stats.reset()
+
+
+if __name__ == '__main__':
+    import re
+
+    import some_module
+
+    @instrument(sample_every=10)
+    def remove_punctuation(value):
+        return re.sub('[!#?]', '', value)
+
+    @instrument
+    def attempt_float(x):
+        try:
+            return float(x)
+        except (TypeError, ValueError):
+            return x
+
+    instrument_attribute(some_module, 'f')
+
+    for _ in range(10_000):
+        remove_punctuation('Georgia!')
+        attempt_float('1.2345')
+        some_module.f(5)
+    print(dump_json())
@@ -0,0 +1,147 @@
+# lazy_import.py
+
+# 'import numpy as np' and 'import matplotlib.pyplot as plt' at the top of a script are paid for on
+# every run, even when the code path that plots never executes. lazy_module() returns a stand-in
+# module that performs the real import on first attribute access, so heavy dependencies cost
+# nothing until they are used:
+#
+# np = lazy_module('numpy')
+# plt = lazy_module('matplotlib.pyplot')
+#
+# To see where startup time goes, import_time_report() runs an import under 'python -X importtime'
+# and aggregates the per-module self and cumulative times by top-level package, and
+# startup_benchmark() times complete cold starts of a script or statement. From the terminal:
+#
+# > python lazy_import.py report matplotlib.pyplot
+# > python lazy_import.py bench chapter2_python_basics.py
+
+import argparse
+import importlib
+import re
+import statistics
+import subprocess
+import sys
+import time
+import types
+
+
+class LazyModule(types.ModuleType):
+    '''Module stand-in that imports the named module the first time one of its attributes is used'''
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_lazy_module'] is not None else 'not loaded'
+        return f'<lazy module {self.__name__!r} ({state})>'
+
+
+def lazy_module(name):
+    '''Return name's module if it is already imported, otherwise a LazyModule for it'''
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_loaded(module):
+    return not isinstance(module, LazyModule) or module.__dict__['_lazy_module'] is not None
+
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_time_report(statement, python=sys.executable):
+    '''
+    Run 'import <statement>' (or statement itself when it is an 'import ...' or 'from ...'
+    statement) in a fresh interpreter with -X importtime and aggregate the timings by top-level
+    package
+
+    Returns
+    -------
+    rows : list of dicts with 'package', 'self_us' (summed over the package's modules),
+           'cumulative_us' (for the package's outermost imports) and 'modules', slowest first
+    '''
+    is_statement = statement.lstrip().startswith(('import ', 'from '))
+    code = statement if is_statement else f'import {statement}'
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], capture_output=True,
+                            text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    entries = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.setdefault(module.split('.')[0], []).append(
+                (len(indent), int(self_us), int(cumulative_us)))
+
+    rows = []
+    for package, timings in entries.items():
+        # The package's least-nested imports already include everything imported beneath them
+        outermost = min(depth for depth, _, _ in timings)
+        rows.append({
+            'package': package,
+            'modules': len(timings),
+            'self_us': sum(self_us for _, self_us, _ in timings),
+            'cumulative_us': sum(cumulative for depth, _, cumulative in timings
+                                 if depth == outermost),
+        })
+    return sorted(rows, key=lambda row: row['cumulative_us'], reverse=True)
+
+
+def startup_benchmark(target, runs=10, python=sys.executable):
+    '''
+    Time complete interpreter cold starts running target (a script path or, if it does not end in
+    .py, a statement passed with -c). Returns a dict of the best, median and worst seconds.
+    '''
+    command = [python, target] if target.endswith('.py') else [python, '-c', target]
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return {'best': min(timings), 'median': statistics.median(timings), 'worst': max(timings)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import-time profiling and startup benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    report = commands.add_parser('report', help='aggregate -X importtime output by package')
+    report.add_argument('statement', help='module name or an import statement')
+    report.add_argument('--top', type=int, default=20)
+    bench = commands.add_parser('bench', help='time cold starts of scripts or statements')
+    bench.add_argument('targets', nargs='+')
+    bench.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == 'report':
+        rows = import_time_report(args.statement)
+        print(f'{"package":<30}{"modules":>8}{"self ms":>10}{"cumulative ms":>15}')
+        for row in rows[:args.top]:
+            print(f'{row["package"]:<30}{row["modules"]:>8}{row["self_us"] / 1000:>10.1f}'
+                  f'{row["cumulative_us"] / 1000:>15.1f}')
+    else:
+        for target in args.targets:
+            result = startup_benchmark(target, args.runs)
+            print(f'{target}: best {result["best"] * 1000:.1f} ms, '
+                  f'median {result["median"] * 1000:.1f} ms, worst {result["worst"] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
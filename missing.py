@@ -0,0 +1,113 @@
+# missing.py
+
+# The loop 'for value in sequence: if value is None: continue; total += value' sums a column with
+# gaps one element at a time. to_masked() converts such a sequence into a NumPy values array plus a
+# validity mask in one pass, to_nan_array() into a float array with NaN for the gaps, and the
+# masked_* reductions skip the invalid entries inside NumPy's loops via where=.
+
+import numpy as np
+
+
+def to_nan_array(sequence, dtype=np.float64):
+    '''Convert a sequence with None gaps to a float array with NaN in their place'''
+    # NumPy's float conversion already maps None to NaN in a single C-level pass
+    return np.array(sequence, dtype=dtype)
+
+
+def to_masked(sequence, dtype=np.float64, fill=0):
+    '''
+    Convert a sequence with None gaps to a (values, valid) pair
+
+    Parameters
+    ----------
+    sequence : flat sequence of numbers and None
+    dtype : dtype of the values array
+    fill : value stored at the positions of None
+
+    Returns
+    -------
+    values : ndarray of dtype
+    valid : boolean ndarray, False where the sequence held None
+    '''
+    if not isinstance(sequence, (list, tuple)):
+        sequence = list(sequence)
+    dtype = np.dtype(dtype)
+
+    # Convert through float64 in one C-level pass (None becomes NaN), then tell the gaps apart
+    # from genuine NaN values by looking only at the NaN positions
+    floats = np.array(sequence, dtype=np.float64)
+    valid = np.ones(len(floats), dtype=bool)
+    gaps = np.flatnonzero(np.isnan(floats))
+    valid[gaps] = [sequence[i] is not None for i in gaps.tolist()]
+    floats[~valid] = fill
+
+    if dtype.kind in 'fc' or np.abs(floats).max(initial=0) < 2 ** 53:
+        return floats.astype(dtype), valid
+
+    # Integers too large to pass through float64 exactly
+    objects = np.empty(len(sequence), dtype=object)
+    objects[:] = sequence
+    values = np.full(len(objects), fill, dtype=dtype)
+    values[valid] = objects[valid]
+    return values, valid
+
+
+def _mask(values, valid):
+    values = np.asarray(values)
+    if valid is None:
+        valid = ~np.isnan(values) if values.dtype.kind in 'fc' else np.ones(values.shape, bool)
+    return values, np.asarray(valid, dtype=bool)
+
+
+def masked_count(values, valid=None):
+    '''Number of valid entries (non-NaN entries when valid is omitted)'''
+    values, valid = _mask(values, valid)
+    return int(np.count_nonzero(valid))
+
+
+def masked_sum(values, valid=None):
+    '''Sum of the valid entries; 0 when there are none'''
+    values, valid = _mask(values, valid)
+    return np.sum(values, where=valid)
+
+
+def masked_mean(values, valid=None):
+    '''Mean of the valid entries; None when there are none'''
+    values, valid = _mask(values, valid)
+    count = np.count_nonzero(valid)
+    return np.sum(values, where=valid, dtype=np.float64) / count if count else None
+
+
+def _extreme(reduce, values, valid, initial):
+    values, valid = _mask(values, valid)
+    if not valid.any():
+        return None
+    return reduce(values, where=valid, initial=initial)
+
+
+def masked_min(values, valid=None):
+    '''Minimum of the valid entries; None when there are none'''
+    values = np.asarray(values)
+    high = np.iinfo(values.dtype).max if values.dtype.kind in 'iu' else np.inf
+    return _extreme(np.min, values, valid, high)
+
+
+def masked_max(values, valid=None):
+    '''Maximum of the valid entries; None when there are none'''
+    values = np.asarray(values)
+    low = np.iinfo(values.dtype).min if values.dtype.kind in 'iu' else -np.inf
+    return _extreme(np.max, values, valid, low)
+
+
+def sum_skipping_none(sequence):
+    '''Vectorized equivalent of summing a sequence while skipping None'''
+    return masked_sum(*to_masked(sequence))
+
+
+if __name__ == '__main__':
+    sequence = [1, 2, None, 4, None, 5]
+    values, valid = to_masked(sequence, dtype=np.int64)
+    print(values, valid)
+    print(masked_sum(values, valid), masked_mean(values, valid), masked_min(values, valid),
+          masked_max(values, valid), masked_count(values, valid))
+    print(masked_sum(to_nan_array(sequence)))
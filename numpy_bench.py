@@ -0,0 +1,323 @@
+# numpy_bench.py
+
+# Chapter 4 introduces array creation (zeros, empty, full, identity), astype casts, vectorized
+# arithmetic, boolean and fancy indexing, transposes, np.dot and the universal functions. This
+# script times each of them at sizes from a few KB (L1-resident) up to GBs and reports, for each
+# result, the memory bandwidth and GFLOP/s it achieved next to the machine's measured peaks. Peak
+# bandwidth is measured with a STREAM-style copy/triad at every size, so an L1-resident operation
+# is compared with what L1 can deliver and a GB-sized one with main memory; peak GFLOP/s is the
+# fastest float64 matrix product over 2048 x 2048 and the square sizes the np.dot case runs at.
+# Each result is classified as:
+#
+#   overhead  - the call takes only a few times as long as a NumPy call on a 1-element array
+#   bandwidth - it reaches a larger fraction of peak bandwidth than of peak GFLOP/s
+#   compute   - it reaches a larger fraction of peak GFLOP/s than of peak bandwidth
+#
+# The efficiency column is the larger of the two fractions; a low value with 'bandwidth' means
+# the operation is limited by memory latency rather than throughput (fancy indexing, for example).
+#
+# > python numpy_bench.py --max-bytes 4e9 --json numpy_bench.json
+#
+# Byte counts are the minimum traffic the operation needs (each input read once, each output
+# written once) and FLOP counts treat every ufunc evaluation as one operation. Large np.zeros and
+# np.identity results are lazily zeroed pages that cost nothing until written, so those cases write
+# one element per page of their result, which is when the operating system zeroes the memory.
+
+import argparse
+import json
+import timeit
+
+import numpy as np
+
+PEAK_DOT_SIZE = 2048
+
+# Results taking less than this many times the 1-element call overhead are overhead-bound
+OVERHEAD_FACTOR = 5
+
+# np.dot is skipped for sizes whose product would need more floating point operations than this
+MAX_DOT_FLOPS = 5e10
+
+# Stride in bytes at which lazily allocated results are written to fault in every page
+PAGE_BYTES = 4096
+
+
+def time_call(func, repeat=3):
+    '''Best seconds per call, using timeit's autorange to pick the number of calls per batch'''
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def stream_bandwidth(nbytes, repeat=3):
+    '''Best GB/s of a copy and a triad over float64 arrays of nbytes each'''
+    n = max(nbytes // 8, 1)
+    a, b, c = np.ones(n), np.ones(n), np.empty(n)
+    copy = time_call(lambda: np.copyto(c, a), repeat)
+    # c = a + 3 * b in two passes over c: reads b, a and c, writes c twice
+    triad = time_call(lambda: np.add(a, np.multiply(b, 3.0, out=c), out=c), repeat)
+    return max(2 * 8 * n / copy, 5 * 8 * n / triad) / 1e9
+
+
+def measure_peaks(sizes, dot_size=PEAK_DOT_SIZE, repeat=3):
+    '''
+    Returns
+    -------
+    peaks : dict with 'bandwidth_gbs' ({size: stream_bandwidth(size)} for every operand size),
+            'gflops' (fastest float64 matrix product of dot_size x dot_size and of the square
+            sizes the np.dot case uses for these operand sizes) and 'call_overhead_s' (np.add on
+            1-element arrays)
+    '''
+    bandwidth = {}
+    for size in sizes:
+        try:
+            bandwidth[size] = stream_bandwidth(size, repeat)
+        except MemoryError:
+            break
+
+    gflops = 0.0
+    for k in sorted({dot_size} | {max(int((size // 8) ** 0.5), 1) for size in sizes}):
+        if 2 * k ** 3 > MAX_DOT_FLOPS:
+            continue
+        x, y = np.random.randn(k, k), np.random.randn(k, k)
+        gflops = max(gflops, 2 * k ** 3 / time_call(lambda: np.dot(x, y), repeat) / 1e9)
+
+    one = np.ones(1)
+    overhead = time_call(lambda: np.add(one, one), repeat)
+    return {'bandwidth_gbs': bandwidth, 'gflops': gflops, 'call_overhead_s': overhead}
+
+
+def _square(n):
+    k = max(int(n ** 0.5), 1)
+    return k, np.random.randn(k, k)
+
+
+# Each case maps an element count n (float64 elements in the main operand) to
+# (function, bytes moved, floating point operations), or None to skip that size
+def _touched(arr):
+    '''Write one element per page of arr, forcing lazily zeroed memory to be allocated'''
+    pages = arr.reshape(-1)[::max(PAGE_BYTES // arr.itemsize, 1)]
+    pages += 0
+    return arr
+
+
+def _zeros(n):
+    return lambda: _touched(np.zeros(n)), 8 * n, 0
+
+
+def _empty(n):
+    return lambda: np.empty(n), 0, 0
+
+
+def _full(n):
+    return lambda: np.full(n, 7.0), 8 * n, 0
+
+
+def _identity(n):
+    k = max(int(n ** 0.5), 1)
+    return lambda: _touched(np.identity(k)), 8 * k * k, 0
+
+
+def _astype_int32(n):
+    arr = np.random.randn(n)
+    return lambda: arr.astype(np.int32), 12 * n, 0
+
+
+def _astype_float64(n):
+    arr = np.arange(n)
+    return lambda: arr.astype(np.float64), 16 * n, 0
+
+
+def _add(n):
+    x, y = np.random.randn(n), np.random.randn(n)
+    return lambda: x + y, 24 * n, n
+
+
+def _chapter_expression(n):
+    # data + (data * 2): one temporary, two passes
+    data = np.random.randn(n)
+    return lambda: data + (data * 2), 40 * n, 2 * n
+
+
+def _multiply_inplace(n):
+    arr = np.random.randn(n)
+    return lambda: np.multiply(arr, 1.0, out=arr), 16 * n, n
+
+
+def _boolean_index(n):
+    data = np.random.randn(n)
+    mask = data > 0
+    kept = int(mask.sum())
+    return lambda: data[mask], 9 * n + 8 * kept, 0
+
+
+def _compare(n):
+    data = np.random.randn(n)
+    return lambda: data > 0, 9 * n, n
+
+
+def _fancy_index(n):
+    data = np.random.randn(n)
+    indices = np.random.randint(0, n, n)
+    return lambda: data[indices], 24 * n, 0
+
+
+def _transpose_view(n):
+    _, arr = _square(n)
+    return lambda: arr.T, 0, 0
+
+
+def _transpose_copy(n):
+    k, arr = _square(n)
+    return lambda: np.ascontiguousarray(arr.T), 16 * k * k, 0
+
+
+def _dot(n):
+    # Two distinct operands: np.dot(arr.T, arr) is a symmetric product that BLAS does in half
+    # the operations
+    k, x = _square(n)
+    if 2 * k ** 3 > MAX_DOT_FLOPS:
+        return None
+    y = np.random.randn(k, k)
+    return lambda: np.dot(x, y), 24 * k * k, 2 * k ** 3
+
+
+def _unary(ufunc):
+    def case(n):
+        arr = np.abs(np.random.randn(n))
+        return lambda: ufunc(arr), 16 * n, n
+    return case
+
+
+def _maximum(n):
+    x, y = np.random.randn(n), np.random.randn(n)
+    return lambda: np.maximum(x, y), 24 * n, n
+
+
+def _modf(n):
+    arr = np.random.randn(n) * 5
+    return lambda: np.modf(arr), 24 * n, n
+
+
+CASES = {
+    'zeros': _zeros,
+    'empty': _empty,
+    'full': _full,
+    'identity': _identity,
+    'astype f8->i4': _astype_int32,
+    'astype i8->f8': _astype_float64,
+    'x + y': _add,
+    'data + data * 2': _chapter_expression,
+    'multiply out=': _multiply_inplace,
+    'data > 0': _compare,
+    'data[mask]': _boolean_index,
+    'data[indices]': _fancy_index,
+    'arr.T': _transpose_view,
+    'ascontiguous(arr.T)': _transpose_copy,
+    'np.dot(x, y)': _dot,
+    'np.sqrt': _unary(np.sqrt),
+    'np.exp': _unary(np.exp),
+    'np.maximum': _maximum,
+    'np.modf': _modf,
+}
+
+
+def default_sizes(min_bytes=1 << 14, max_bytes=1 << 30, factor=4):
+    '''Operand sizes in bytes from min_bytes (L1-resident) up to max_bytes, multiplying by factor'''
+    sizes = []
+    size = min_bytes
+    while size <= max_bytes:
+        sizes.append(int(size))
+        size *= factor
+    return sizes
+
+
+def classify(size, seconds, gbs, gflops, peaks):
+    '''Return (bound, efficiency) for one measurement on operands of size bytes'''
+    bandwidth = peaks['bandwidth_gbs']
+    # Sizes beyond the largest measured one are compared with that one (main memory)
+    peak_gbs = bandwidth.get(size) or bandwidth[max(bandwidth)]
+    bandwidth_fraction = gbs / peak_gbs
+    flops_fraction = gflops / peaks['gflops']
+    efficiency = max(bandwidth_fraction, flops_fraction)
+    if seconds < OVERHEAD_FACTOR * peaks['call_overhead_s']:
+        return 'overhead', efficiency
+    if flops_fraction > bandwidth_fraction:
+        return 'compute', efficiency
+    return 'bandwidth', efficiency
+
+
+def benchmark(sizes=None, cases=None, peaks=None, repeat=3, log=None):
+    '''
+    Run every case at every operand size (bytes); peaks are measured first unless given
+
+    Returns
+    -------
+    peaks : the dict from measure_peaks()
+    results : list of dicts with 'case', 'bytes', 'seconds', 'gbs', 'gflops', 'bound' and
+              'efficiency'
+    '''
+    sizes = sizes or default_sizes()
+    peaks = peaks or measure_peaks(sizes, repeat=repeat)
+    results = []
+    for name in cases or CASES:
+        for size in sizes:
+            try:
+                case = CASES[name](size // 8)
+                if case is None:
+                    continue
+                func, nbytes, flops = case
+                seconds = time_call(func, repeat)
+            except MemoryError:
+                continue
+            # Release the operands before allocating the next size
+            del case, func
+            gbs, gflops = nbytes / seconds / 1e9, flops / seconds / 1e9
+            bound, efficiency = classify(size, seconds, gbs, gflops, peaks)
+            results.append({'case': name, 'bytes': size, 'seconds': seconds, 'gbs': gbs,
+                            'peak_gbs': peaks['bandwidth_gbs'].get(size), 'gflops': gflops,
+                            'bound': bound, 'efficiency': efficiency})
+            if log:
+                log(results[-1])
+    return peaks, results
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.3g} {unit}'
+        size /= 1024
+
+
+def _print_row(row):
+    peak = f'{row["peak_gbs"]:.2f}' if row['peak_gbs'] else 'n/a'
+    print(f'{row["case"]:<22}{_format_bytes(row["bytes"]):>10}{row["seconds"] * 1e6:>14.2f}'
+          f'{row["gbs"]:>10.2f}{peak:>11}{row["gflops"]:>10.2f}{row["efficiency"]:>8.0%}'
+          f'  {row["bound"]}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bandwidth and FLOP/s of chapter 4 operations')
+    parser.add_argument('--min-bytes', type=float, default=1 << 14)
+    parser.add_argument('--max-bytes', type=float, default=1 << 30)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='also write peaks and results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = default_sizes(int(args.min_bytes), int(args.max_bytes))
+    peaks = measure_peaks(sizes, repeat=args.repeat)
+    print(f'peak {peaks["gflops"]:.2f} GFLOP/s, '
+          f'call overhead {peaks["call_overhead_s"] * 1e6:.2f} us, peak bandwidth:')
+    for size, gbs in peaks['bandwidth_gbs'].items():
+        print(f'{_format_bytes(size):>10}{gbs:>10.2f} GB/s')
+    print(f'{"case":<22}{"size":>10}{"us per call":>14}{"GB/s":>10}{"peak GB/s":>11}'
+          f'{"GFLOP/s":>10}{"eff":>8}  bound')
+    _, results = benchmark(sizes, args.cases, peaks, args.repeat, log=_print_row)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'peaks': peaks, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# record_formatter.py
+
+# template.format(4.5560, 'Argentine Pesos', 1) formats one record per call. RecordFormatter parses
+# the template once and then formats whole columns at a time: integer and string fields are
+# converted with vectorized NumPy casts, fixed-point floats are rounded with integer arithmetic,
+# and the converted columns are concatenated with the template's literal text chunk by chunk and
+# streamed to a file. Any field the fast paths do not cover falls back to format() per element, so
+# the output is always identical to calling template.format() on each row.
+
+import codecs
+import re
+import string
+
+import numpy as np
+
+# Format specs handled without calling format() per element
+FIXED_FLOAT_SPEC = re.compile(r'\.(\d+)f')
+
+# Encodings in which ASCII text encodes to the same bytes, so lines can be assembled directly
+ASCII_COMPATIBLE = ('utf-8', 'ascii', 'iso8859-1', 'cp1252')
+
+# Rows formatted per chunk when writing to a file
+CHUNK_ROWS = 1 << 16
+
+
+def _digit_strings(values, width):
+    '''Zero-padded decimal strings of non-negative integers, built from a digit matrix'''
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    codes = ((values[:, None] // powers) % 10 + ord('0')).astype(np.uint32)
+    return codes.view(f'U{width}').reshape(-1)
+
+
+def _int_strings(magnitude, negative):
+    '''
+    Decimal strings of integers given as uint64 magnitudes and a sign mask, matching str(int).
+    Each row of the code matrix holds an optional '-' followed by the digits, left-aligned and
+    padded with zeros (which NumPy treats as the end of the string).
+    '''
+    powers = 10 ** np.arange(20, dtype=np.uint64)
+    n_digits = np.maximum(np.searchsorted(powers, magnitude, side='right'), 1)
+    offset = negative.astype(np.int64)
+    width = int((n_digits + offset).max()) if len(magnitude) else 1
+
+    position = np.arange(width) - offset[:, None]
+    exponent = n_digits[:, None] - 1 - position
+    in_number = (position >= 0) & (exponent >= 0)
+    digits = (magnitude[:, None] // powers[np.clip(exponent, 0, 19)]) % np.uint64(10)
+    codes = np.where(in_number, digits + ord('0'), 0).astype(np.uint32)
+    codes[negative, 0] = ord('-')
+    return codes.view(f'U{width}').reshape(-1)
+
+
+def _format_int(column):
+    if column.dtype == np.uint64:
+        return _int_strings(column, np.zeros(len(column), dtype=bool))
+    column = column.astype(np.int64)
+    negative = column < 0
+    # -(x + 1) + 1 avoids overflowing on the most negative int64
+    magnitude = np.where(negative, (-(column + 1)).astype(np.uint64) + np.uint64(1),
+                         column.astype(np.uint64))
+    return _int_strings(magnitude, negative)
+
+
+def _format_fixed(column, digits):
+    '''
+    '%.Nf' formatting with integer arithmetic. Values whose scaled fraction lies too close to a
+    rounding tie to be decided in floating point (and non-finite or huge values) are handed to
+    np.char.mod, which formats them exactly like str.format.
+    '''
+    column = column.astype(np.float64)
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled = np.abs(column) * 10.0 ** digits
+        rounded = np.rint(scaled)
+        tie_distance = np.abs(scaled - np.floor(scaled) - 0.5)
+        exact = (scaled < 2.0 ** 52) & (tie_distance > 4 * np.spacing(scaled))
+
+    whole = np.where(exact, rounded, 0).astype(np.int64)
+    lines = _int_strings((whole // 10 ** digits).astype(np.uint64), np.signbit(column))
+    if digits:
+        lines = np.char.add(np.char.add(lines, '.'), _digit_strings(whole % 10 ** digits, digits))
+
+    if not exact.all():
+        inexact = np.char.mod(f'%.{digits}f', column[~exact])
+        lines = lines.astype(f'U{max(lines.itemsize, inexact.itemsize) // 4}')
+        lines[~exact] = inexact
+    return lines
+
+
+def _fallback(column, spec, conversion):
+    convert = {None: lambda x: x, 's': str, 'r': repr, 'a': ascii}[conversion]
+    formatted = np.frompyfunc(lambda x: format(convert(x), spec), 1, 1)(column)
+    return formatted.astype(str)
+
+
+def _format_column(column, spec, conversion):
+    '''Format one column of values with a single format spec'''
+    kind = column.dtype.kind
+    if conversion is None:
+        if kind in 'iu' and spec in ('', 'd'):
+            return _format_int(column)
+        if kind == 'U' and spec in ('', 's'):
+            return column
+        match = FIXED_FLOAT_SPEC.fullmatch(spec)
+        if kind == 'f' and match and int(match.group(1)) <= 15:
+            return _format_fixed(column, int(match.group(1)))
+    return _fallback(column, spec, conversion)
+
+
+def _render_ascii(pieces, n):
+    '''
+    Assemble n lines from pieces (string arrays and literal str) directly into one byte buffer.
+    Returns None when any text is outside ASCII, in which case the caller encodes instead.
+    '''
+    parts = []
+    line_lengths = np.zeros(n, dtype=np.int64)
+    for piece in pieces:
+        if isinstance(piece, str):
+            if not piece.isascii():
+                return None
+            parts.append((np.frombuffer(piece.encode('ascii'), dtype=np.uint8), None))
+            line_lengths += len(piece)
+        else:
+            codes = np.ascontiguousarray(piece).view(np.uint32).reshape(n, -1)
+            if codes.size and codes.max() >= 128:
+                return None
+            lengths = np.char.str_len(piece)
+            parts.append((codes.astype(np.uint8), lengths))
+            line_lengths += lengths
+
+    ends = np.cumsum(line_lengths)
+    buffer = np.empty(int(ends[-1]) if n else 0, dtype=np.uint8)
+    position = ends - line_lengths
+    for codes, lengths in parts:
+        columns = np.arange(len(codes) if lengths is None else codes.shape[1])
+        if lengths is None:
+            buffer[position[:, None] + columns] = codes
+            position += len(codes)
+        else:
+            keep = columns < lengths[:, None]
+            buffer[(position[:, None] + columns)[keep]] = codes[keep]
+            position += lengths
+    return buffer.tobytes()
+
+
+class RecordFormatter:
+    '''
+    A str.format template compiled for formatting columns of records
+
+    Parameters
+    ----------
+    template : format string such as '{0:.2f} {1:s} are worth US${2:d}'; fields may be numbered,
+               automatically numbered ('{}') or named
+    '''
+
+    def __init__(self, template):
+        self.template = template
+        self.literals = []
+        self.fields = []
+        auto_index, manual = 0, False
+        for literal, name, spec, conversion in string.Formatter().parse(template):
+            self.literals.append(literal)
+            if name is None:
+                continue
+            if name == '':
+                if manual:
+                    raise ValueError('cannot switch from manual field specification to '
+                                     'automatic field numbering')
+                name = auto_index
+                auto_index += 1
+            elif name.isdigit():
+                if auto_index:
+                    raise ValueError('cannot switch from automatic field numbering to manual '
+                                     'field specification')
+                name, manual = int(name), True
+            elif not name.isidentifier():
+                raise ValueError(f'attribute and item access is not supported: {{{name}}}')
+            if '{' in spec:
+                raise ValueError('nested replacement fields in format specs are not supported')
+            self.fields.append((name, spec, conversion))
+        # Literal text following the last field
+        if len(self.literals) == len(self.fields):
+            self.literals.append('')
+
+    def _columns(self, args, kwargs):
+        columns = {}
+        for name, _, _ in self.fields:
+            column = args[name] if isinstance(name, int) else kwargs[name]
+            columns[name] = np.asarray(column)
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError('all columns must have the same length')
+        return columns, lengths.pop() if lengths else 0
+
+    def _pieces(self, columns):
+        '''The formatted columns interleaved with the non-empty literal text, in template order'''
+        pieces = [self.literals[0]] if self.literals[0] else []
+        for (name, spec, conversion), literal in zip(self.fields, self.literals[1:]):
+            pieces.append(_format_column(columns[name], spec, conversion))
+            if literal:
+                pieces.append(literal)
+        return pieces
+
+    def format_columns(self, *args, **kwargs):
+        '''
+        Format each row of the given columns
+
+        Returns
+        -------
+        lines : 'U' array where lines[i] == template.format(*(col[i] for col in args), ...)
+        '''
+        columns, n = self._columns(args, kwargs)
+        lines = np.full(n, '')
+        for piece in self._pieces(columns):
+            lines = np.char.add(lines, piece)
+        return lines
+
+    def write(self, file, *args, chunk_rows=CHUNK_ROWS, line_end='\n', encoding='utf-8',
+              **kwargs):
+        '''
+        Format the columns chunk by chunk and write one line per row to file (a path or a binary
+        file object). Returns the number of rows written.
+        '''
+        columns, n = self._columns(args, kwargs)
+        if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+            with open(file, 'wb') as f:
+                return self.write(f, *args, chunk_rows=chunk_rows, line_end=line_end,
+                                  encoding=encoding, **kwargs)
+
+        ascii_compatible = codecs.lookup(encoding).name in ASCII_COMPATIBLE
+        for start in range(0, n, chunk_rows):
+            chunk = {name: column[start:start + chunk_rows] for name, column in columns.items()}
+            pieces = self._pieces(chunk) + [line_end]
+            data = _render_ascii(pieces, min(chunk_rows, n - start)) if ascii_compatible else None
+            if data is None:
+                lines = np.full(min(chunk_rows, n - start), '')
+                for piece in pieces:
+                    lines = np.char.add(lines, piece)
+                data = ''.join(lines.tolist()).encode(encoding)
+            file.write(data)
+        return n
+
+
+if __name__ == '__main__':
+    template = '{0:.2f} {1:s} are worth US${2:d}'
+    amounts = np.random.randn(1000) * 100
+    currencies = np.array(['Argentine Pesos', 'Euros', 'Yen'] * 333 + ['Pounds'])
+    dollars = np.random.randint(-1000, 1000, 1000)
+
+    lines = RecordFormatter(template).format_columns(amounts, currencies, dollars)
+    expected = [template.format(*row) for row in zip(amounts.tolist(), currencies.tolist(),
+                                                     dollars.tolist())]
+    assert lines.tolist() == expected
+    print(lines[:3])
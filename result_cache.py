@@ -0,0 +1,252 @@
+# result_cache.py
+
+# np.dot(arr.T, arr), a cleaned list of strings or a column of parsed floats is recomputed on every
+# run of a script even when its inputs have not changed. ResultCache.memoize() keeps such results
+# on disk, keyed by a hash of the function's name and its arguments:
+#
+# cache = ResultCache('~/.cache/analysis', max_bytes=2e9)
+#
+# @cache.memoize
+# def gram(arr):
+#     return np.dot(arr.T, arr)
+#
+# Array results are stored as .npy files and come back as read-only memory maps, so a hit costs
+# one hash of the inputs plus an mmap, whatever the size of the result; other results are pickled.
+# Array arguments are hashed over all of their bytes by default, or with hash_mode='sampled' over
+# their shape, dtype and a fixed number of evenly spaced windows, which is much faster for large
+# arrays but will miss a change that falls between the windows. Files are written to a temporary
+# name and renamed into place, so readers (including other processes) never see a partial result,
+# and the least recently used files are deleted once the cache grows beyond max_bytes.
+
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+
+# Number and size of the windows hashed per array in 'sampled' mode
+SAMPLE_WINDOWS = 64
+SAMPLE_BYTES = 4096
+
+# Lists longer than this are hashed from evenly spaced elements in 'sampled' mode
+SAMPLE_ITEMS = 1024
+
+# Bumped when the key or file format changes, invalidating older entries
+CACHE_VERSION = 2
+
+
+def _array_bytes(arr, hash_mode):
+    if arr.dtype.hasobject:
+        return pickle.dumps(arr.tolist(), protocol=pickle.HIGHEST_PROTOCOL)
+    per_window = max(SAMPLE_BYTES // arr.itemsize, 1)
+    if hash_mode == 'full' or arr.size <= SAMPLE_WINDOWS * per_window:
+        return np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+    # Gather the windows (in C order) without copying the whole array when it is not contiguous
+    starts = np.linspace(0, arr.size - per_window, SAMPLE_WINDOWS).astype(np.intp)
+    flat = (starts[:, None] + np.arange(per_window)).ravel()
+    return np.ascontiguousarray(arr[np.unravel_index(flat, arr.shape)]).view(np.uint8)
+
+
+def _update(digest, obj, hash_mode):
+    '''Feed a canonical encoding of obj (arrays, containers, scalars, anything picklable)'''
+    if isinstance(obj, np.ndarray):
+        digest.update(f'ndarray{obj.dtype.str}{obj.shape}'.encode())
+        digest.update(_array_bytes(obj, hash_mode))
+    elif isinstance(obj, (list, tuple)):
+        digest.update(f'{type(obj).__name__}{len(obj)}'.encode())
+        items = obj
+        if hash_mode == 'sampled' and len(obj) > SAMPLE_ITEMS:
+            items = [obj[i] for i in np.linspace(0, len(obj) - 1, SAMPLE_ITEMS).astype(int)]
+        if all(type(item) is str for item in items):
+            # Fast path for lists of strings: one encode instead of one call per element, with the
+            # lengths hashed too so that strings containing the separator cannot collide
+            digest.update(np.fromiter(map(len, items), np.int64, len(items)).tobytes())
+            digest.update('\x00'.join(items).encode('utf-8', 'surrogatepass'))
+        else:
+            for item in items:
+                _update(digest, item, hash_mode)
+    elif isinstance(obj, dict):
+        digest.update(f'dict{len(obj)}'.encode())
+        for key in sorted(obj, key=repr):
+            _update(digest, key, hash_mode)
+            _update(digest, obj[key], hash_mode)
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        digest.update(f'{type(obj).__name__}:{obj!r}'.encode())
+    else:
+        digest.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    digest.update(b'\x01')
+
+
+def hash_arguments(name, args, kwargs, hash_mode='full'):
+    '''Hex digest identifying a call of the function called name with these arguments'''
+    if hash_mode not in ('full', 'sampled'):
+        raise ValueError("hash_mode must be 'full' or 'sampled'")
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f'{CACHE_VERSION}:{name}'.encode())
+    _update(digest, args, hash_mode)
+    _update(digest, dict(kwargs), hash_mode)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    '''
+    On-disk cache of function results keyed by the hash of their arguments
+
+    Parameters
+    ----------
+    directory : where the cache files live (created if needed)
+    max_bytes : total size of the cache files before least recently used ones are evicted
+    hash_mode : 'full' to hash every byte of array arguments, 'sampled' to hash a sample
+    mmap : return array results as read-only memory maps (otherwise they are read into memory)
+    '''
+
+    def __init__(self, directory, max_bytes=1 << 30, hash_mode='full', mmap=True):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        os.makedirs(self.directory, exist_ok=True)
+        if hash_mode not in ('full', 'sampled'):
+            raise ValueError("hash_mode must be 'full' or 'sampled'")
+        self.max_bytes = int(max_bytes)
+        self.hash_mode = hash_mode
+        self.mmap = mmap
+        self.hits = self.misses = self.evictions = self.bytes_written = 0
+        self.hit_seconds = self.miss_seconds = 0.0
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def load(self, key):
+        '''Return (True, result) for a cached key, (False, None) otherwise'''
+        for suffix in ('.npy', '.pkl'):
+            path = self._path(key, suffix)
+            try:
+                if suffix == '.npy':
+                    result = np.load(path, mmap_mode='r' if self.mmap else None)
+                else:
+                    with open(path, 'rb') as f:
+                        result = pickle.load(f)
+            except FileNotFoundError:
+                continue
+            # The modification time records the last use for LRU eviction
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            return True, result
+        return False, None
+
+    def store(self, key, result):
+        '''Atomically write result under key, then evict old entries if over max_bytes'''
+        is_array = isinstance(result, np.ndarray) and not result.dtype.hasobject
+        path = self._path(key, '.npy' if is_array else '.pkl')
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if is_array:
+                    np.save(f, result)
+                else:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.bytes_written += os.path.getsize(path)
+        self.evict()
+
+    def entries(self):
+        '''(path, size, last used time) of every cache file, least recently used first'''
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(('.npy', '.pkl')):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        '''Delete least recently used files until the cache holds at most max_bytes'''
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        self.evict(0)
+
+    def memoize(self, func=None, *, name=None):
+        '''
+        Decorator caching func's results; can be used bare (@cache.memoize) or with a name
+        (@cache.memoize(name='gram_v2')) to separate results when the function's code changes
+        '''
+        if func is None:
+            return functools.partial(self.memoize, name=name)
+        func_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            key = hash_arguments(func_name, args, kwargs, self.hash_mode)
+            found, result = self.load(key)
+            if found:
+                self.hits += 1
+                self.hit_seconds += time.perf_counter() - start
+                return result
+            result = func(*args, **kwargs)
+            self.store(key, result)
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+            return result
+
+        wrapper.cache = self
+        return wrapper
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / calls if calls else None,
+            'evictions': self.evictions,
+            'bytes_written': self.bytes_written,
+            'mean_hit_ms': self.hit_seconds / self.hits * 1000 if self.hits else None,
+            'mean_miss_ms': self.miss_seconds / self.misses * 1000 if self.misses else None,
+            'size_bytes': self.size(),
+        }
+
+
+if __name__ == '__main__':
+    import re
+
+    cache = ResultCache(os.path.join(tempfile.gettempdir(), 'result_cache_demo'), max_bytes=1e9)
+
+    @cache.memoize
+    def gram(arr):
+        return np.dot(arr.T, arr)
+
+    @cache.memoize
+    def clean_strings(strings):
+        return [re.sub('[!#?]', '', value).strip().title() for value in strings]
+
+    arr = np.random.default_rng(0).standard_normal((20_000, 500))
+    states = ['   Alabama ', 'Georgia!', 'Georgia', 'georgia', 'FlOrIda',
+              'south   carolina##', 'West virginia?'] * 10_000
+    for _ in range(3):
+        gram(arr)
+        clean_strings(states)
+    print(cache.stats())
@@ -0,0 +1,164 @@
+# row_fill.py
+
+# Chapter 4 fills an array one row at a time:
+#
+# arr = np.empty((8, 4))
+# for i in range(8):
+#     arr[i] = i
+#
+# which costs one Python-level assignment per row. fill_rows() takes the same row function and,
+# when the function is NumPy-expressible, calls it once with the whole column of row indices so
+# broadcasting fills every row in a single operation:
+#
+# arr = fill_rows((8, 4), lambda i: i)
+#
+# Whether a function can be vectorized is checked by calling it on an index array for a few probe
+# rows and comparing the result with calling it on the same rows one at a time; functions that
+# raise (e.g. 'if i > 3:' on an array) or give different answers fall back to the loop. Either
+# way, large fills are split into blocks of rows computed in a thread pool (array_gather's
+# run_blocks(), shared with transpose.py), so the vectorized path keeps its temporaries small and
+# the loop path overlaps rows whose work releases the GIL. benchmark() measures where fill_rows()
+# starts beating the plain loop.
+
+import argparse
+
+import numpy as np
+
+from array_gather import run_blocks
+from transpose import best_time
+
+# Rows per block are chosen so that a block of output is about this size
+BLOCK_BYTES = 1 << 20
+
+
+def _index_column(rows, row_ndim):
+    '''Row indices shaped to broadcast against (len(rows),) + row_shape'''
+    return np.asarray(rows, dtype=np.intp).reshape((-1,) + (1,) * row_ndim)
+
+
+def can_vectorize(func, shape, dtype=np.float64):
+    '''
+    Whether func(i), written for a single integer row index, gives the same rows when called
+    with an array of row indices (checked on the first, middle and last rows)
+    '''
+    n_rows, row_shape = shape[0], tuple(shape[1:])
+    if n_rows == 0:
+        return True
+    probe = sorted({0, n_rows // 2, n_rows - 1})
+    batched = np.empty((len(probe),) + row_shape, dtype=dtype)
+    single = np.empty_like(batched)
+    try:
+        with np.errstate(all='ignore'):
+            batched[...] = func(_index_column(probe, len(row_shape)))
+            for j, i in enumerate(probe):
+                single[j] = func(i)
+    except Exception:
+        return False
+    if batched.dtype.kind in 'fc':
+        # Vectorized loops may round differently from the scalar path in the last place
+        with np.errstate(all='ignore'):
+            close = (batched == single) | (np.abs(batched - single) <= 1e-12 * np.abs(single))
+        return bool((close | (np.isnan(batched) & np.isnan(single))).all())
+    return bool((batched == single).all())
+
+
+def fill_rows(shape, func, dtype=np.float64, out=None, vectorize=None, block_rows=None,
+              n_threads=None):
+    '''
+    Fill out[i] = func(i) for every row i
+
+    Parameters
+    ----------
+    shape : shape of the result; the first axis is the row axis
+    func : function of an integer row index returning a value broadcastable to shape[1:]
+    dtype : dtype of the result (ignored when out is given)
+    out : optional ndarray to fill instead of allocating one
+    vectorize : True to call func on arrays of row indices, False to call it once per row,
+                None to decide with can_vectorize()
+    block_rows : rows computed per block, by default enough for about BLOCK_BYTES of output
+    n_threads : number of worker threads, defaults to the CPU count for large fills
+
+    Returns
+    -------
+    out : the filled ndarray
+    '''
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    n_rows, row_shape = out.shape[0], out.shape[1:]
+    if vectorize is None:
+        vectorize = can_vectorize(func, out.shape, out.dtype)
+    if block_rows is None:
+        row_bytes = max(out.itemsize * int(np.prod(row_shape)), 1)
+        block_rows = max(BLOCK_BYTES // row_bytes, 1)
+
+    if vectorize:
+        rows = _index_column(np.arange(n_rows), len(row_shape))
+
+        def fill_block(start):
+            stop = start + block_rows
+            out[start:stop] = func(rows[start:stop])
+    else:
+        def fill_block(start):
+            for i in range(start, min(start + block_rows, n_rows)):
+                out[i] = func(i)
+
+    run_blocks(fill_block, range(0, n_rows, block_rows), out.nbytes, n_threads)
+    return out
+
+
+def _loop_fill(shape, func, dtype=np.float64):
+    arr = np.empty(shape, dtype=dtype)
+    for i in range(shape[0]):
+        arr[i] = func(i)
+    return arr
+
+
+def benchmark(max_rows=10 ** 6, width=4, repeat=3):
+    '''
+    Time the Python loop against fill_rows() for the chapter's fill (row i is all i) with row
+    counts from 1 to max_rows, growing by a factor of 4
+
+    Returns
+    -------
+    results : list of dicts with 'rows', 'loop_s', 'fill_s' and 'speedup'
+    crossover : smallest row count from which fill_rows() is faster at every larger size tried,
+                or None if it never is
+    '''
+    def func(i):
+        return i
+
+    results = []
+    n_rows = 1
+    while n_rows <= max_rows:
+        shape = (n_rows, width)
+        loop = best_time(lambda: _loop_fill(shape, func), repeat)
+        fill = best_time(lambda: fill_rows(shape, func), repeat)
+        results.append({'rows': n_rows, 'loop_s': loop, 'fill_s': fill, 'speedup': loop / fill})
+        n_rows *= 4
+
+    crossover = None
+    for row in reversed(results):
+        if row['speedup'] <= 1:
+            break
+        crossover = row['rows']
+    return results, crossover
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark fill_rows against a Python loop')
+    parser.add_argument('--max-rows', type=int, default=10 ** 6)
+    parser.add_argument('--width', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results, crossover = benchmark(args.max_rows, args.width, args.repeat)
+    print(f'{"rows":>10}{"loop s":>12}{"fill_rows s":>14}{"speedup":>10}')
+    for row in results:
+        print(f'{row["rows"]:>10}{row["loop_s"]:>12.6f}{row["fill_s"]:>14.6f}'
+              f'{row["speedup"]:>10.1f}')
+    print(f'fill_rows is faster from {crossover} rows' if crossover else
+          'fill_rows was not faster at any size tried')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# running_stats.py
+
+# np.random.randn(50).cumsum() materializes the whole series before summarizing it. RunningStats
+# summarizes an unbounded stream fed as ndarray chunks in constant memory: a running cumsum that
+# carries over between chunks, count/mean/variance via Welford's update (merged per chunk with
+# Chan's formula), min and max, and approximate quantiles from a logarithmic bucket sketch with a
+# guaranteed relative error. Accumulators built by separate workers combine exactly with merge().
+
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    '''
+    Mergeable quantile sketch with relative accuracy (values are counted in logarithmic buckets,
+    so any quantile is returned within relative_accuracy of a true sample value). Infinities are
+    counted separately and returned exactly.
+    '''
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.infinities = [0, 0]  # -inf, +inf
+        self.count = 0
+
+    def _add_keys(self, store, magnitudes):
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        unique, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(unique.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def update(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float64).reshape(-1)
+        chunk = chunk[~np.isnan(chunk)]
+        self.count += chunk.size
+        infinite = np.isinf(chunk)
+        if infinite.any():
+            positive = int(np.count_nonzero(chunk[infinite] > 0))
+            self.infinities[0] += int(np.count_nonzero(infinite)) - positive
+            self.infinities[1] += positive
+            chunk = chunk[~infinite]
+        self._add_keys(self.positive, chunk[chunk > 0])
+        self._add_keys(self.negative, -chunk[chunk < 0])
+        self.zeros += int(np.count_nonzero(chunk == 0))
+        return self
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError('cannot merge sketches with different accuracies')
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        self.zeros += other.zeros
+        self.infinities = [mine + theirs for mine, theirs in zip(self.infinities, other.infinities)]
+        self.count += other.count
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        seen = self.infinities[0]
+        if seen > rank:
+            return -np.inf
+        # Walk from the most negative value upwards
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        if self.infinities[1]:
+            return np.inf
+        if self.positive:
+            return self._value(max(self.positive))
+        return 0.0 if self.zeros else -self._value(min(self.negative))
+
+
+class RunningStats:
+    '''
+    Constant-memory statistics over a stream of ndarray chunks
+
+    Parameters
+    ----------
+    relative_accuracy : relative error bound for quantile()
+    '''
+
+    def __init__(self, relative_accuracy=0.01):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.total = 0.0
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def update(self, chunk):
+        '''
+        Add a chunk of values (NaN propagates through the cumsum but is skipped by the statistics)
+
+        Returns
+        -------
+        cumsum : running cumulative sum over the stream, for the positions of this chunk
+        '''
+        chunk = np.asarray(chunk, dtype=np.float64).reshape(-1)
+        cumsum = np.cumsum(chunk)
+        cumsum += self.total
+        if chunk.size:
+            self.total = cumsum[-1]
+
+        values = chunk[~np.isnan(chunk)]
+        if values.size:
+            n = values.size
+            mean = values.mean()
+            m2 = np.square(values - mean).sum()
+            self._combine(n, mean, m2)
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self.sketch.update(values)
+        return cumsum
+
+    def _combine(self, n, mean, m2):
+        # Chan et al.'s pairwise update; reduces to Welford's when n == 1
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def merge(self, other):
+        '''Fold another worker's accumulator into this one'''
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.sketch.merge(other.sketch)
+        self.total += other.total
+        return self
+
+    def variance(self, ddof=0):
+        return self.m2 / (self.count - ddof) if self.count > ddof else np.nan
+
+    def std(self, ddof=0):
+        return math.sqrt(self.variance(ddof))
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        return float(np.clip(self.sketch.quantile(q), self.min, self.max))
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.mean,
+            'std': self.std(),
+            'min': self.min,
+            'max': self.max,
+            'median': self.quantile(0.5),
+        }
+
+
+if __name__ == '__main__':
+    data = np.random.randn(1_000_000)
+    left, right = RunningStats(), RunningStats()
+    walk = np.concatenate([left.update(chunk) for chunk in np.array_split(data[:600_000], 7)])
+    right.update(data[600_000:])
+    left.merge(right)
+
+    assert np.allclose(walk, data[:600_000].cumsum())
+    assert np.isclose(left.mean, data.mean()) and np.isclose(left.variance(), data.var())
+    print(left.summary(), np.median(data))
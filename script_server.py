@@ -0,0 +1,238 @@
+# script_server.py
+
+# '%run ipython_script_test.py' re-executes a script inside an interpreter that is already warm.
+# ScriptServer does the same for scripts run thousands of times an hour: it listens on a Unix
+# socket and keeps a pool of worker processes that have already imported the heavy modules (NumPy
+# by default). Each request runs one script in a fresh '__main__' namespace on an idle worker and
+# sends back its stdout, stderr and resulting globals. A worker is replaced after max_runs scripts
+# so that anything a script leaks is bounded. Scripts run in the client's working directory with
+# their own directory first on sys.path, as with 'python script.py'. From the terminal:
+#
+# > python script_server.py serve --socket /tmp/scripts.sock --workers 4
+# > python script_server.py run --socket /tmp/scripts.sock ipython_script_test.py
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import sys
+import tokenize
+import traceback
+import types
+
+DEFAULT_PRELOAD = ('numpy',)
+
+
+def _summarize_globals(namespace):
+    '''JSON-friendly view of a script's globals: plain values as-is, everything else as repr()'''
+    summary = {}
+    for name, value in namespace.items():
+        if name.startswith('__') or isinstance(value, types.ModuleType):
+            continue
+        try:
+            json.dumps(value)
+            summary[name] = value
+        except (TypeError, ValueError):
+            summary[name] = repr(value)
+    return summary
+
+
+def _run_script(request):
+    '''
+    Run a script as 'python script.py' would: as __main__, with its directory first on sys.path,
+    in the client's working directory and with the client's argv
+    '''
+    script = request['script']
+    stdout, stderr = io.StringIO(), io.StringIO()
+    saved = sys.argv, list(sys.path), os.getcwd(), sys.modules['__main__']
+    sys.argv = [script] + list(request.get('argv', []))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    main = types.ModuleType('__main__')
+    main.__file__ = script
+    namespace = main.__dict__
+    result = {'ok': True, 'exit_code': 0}
+    try:
+        if request.get('cwd'):
+            os.chdir(request['cwd'])
+        with tokenize.open(script) as f:
+            code = compile(f.read(), script, 'exec')
+        sys.modules['__main__'] = main
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            exec(code, namespace)
+    except SystemExit as exc:
+        # Same mapping as the interpreter: None is success, other non-integers are printed
+        if exc.code is None or isinstance(exc.code, int):
+            result['exit_code'] = exc.code or 0
+        else:
+            result['exit_code'] = 1
+            stderr.write(f'{exc.code}\n')
+    except BaseException:
+        result.update(ok=False, error=traceback.format_exc())
+    finally:
+        sys.argv, sys.path[:], cwd, sys.modules['__main__'] = saved
+        os.chdir(cwd)
+
+    result['stdout'] = stdout.getvalue()
+    result['stderr'] = stderr.getvalue()
+    if request.get('globals', True):
+        result['globals'] = _summarize_globals(namespace)
+    return result
+
+
+def _worker_main(conn, preload):
+    for name in preload:
+        importlib.import_module(name)
+    conn.send('ready')
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        conn.send(_run_script(request))
+
+
+class Worker:
+    '''A pre-imported interpreter process that runs scripts sent over a pipe'''
+
+    def __init__(self, preload):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_conn, preload),
+                                               daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn.recv()
+        self.runs = 0
+
+    def run(self, request):
+        self.conn.send(request)
+        self.runs += 1
+        return self.conn.recv()
+
+    def stop(self):
+        with contextlib.suppress(OSError):
+            self.conn.send(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class WorkerPool:
+    '''
+    Fixed-size pool of Workers; each worker is replaced after max_runs scripts or if it dies
+    '''
+
+    def __init__(self, n_workers=4, max_runs=100, preload=DEFAULT_PRELOAD):
+        self.max_runs = max_runs
+        self.preload = tuple(preload)
+        self.idle = queue.Queue()
+        for _ in range(n_workers):
+            self.idle.put(Worker(self.preload))
+
+    def run(self, request):
+        worker = self.idle.get()
+        try:
+            result = worker.run(request)
+        except (EOFError, OSError):
+            # The script killed its interpreter (e.g. os._exit); report it and start a new one
+            result = {'ok': False, 'error': 'worker process exited while running the script\n'}
+            worker.runs = self.max_runs
+        if worker.runs >= self.max_runs:
+            worker.stop()
+            worker = Worker(self.preload)
+        self.idle.put(worker)
+        return result
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().stop()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                result = self.server.pool.run(request)
+            except Exception:
+                result = {'ok': False, 'error': traceback.format_exc()}
+            self.wfile.write(json.dumps(result).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class ScriptServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    '''
+    Unix-socket server that runs scripts on a WorkerPool. Requests and responses are single lines
+    of JSON: {"script": path, "argv": [...], "globals": true, "cwd": dir}
+    -> {"ok", "exit_code", "stdout", "stderr", "globals", ...} (plus "error", the traceback,
+    when the script raised)
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, n_workers=4, max_runs=100, preload=DEFAULT_PRELOAD):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.pool = WorkerPool(n_workers, max_runs, preload)
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.server_address)
+
+
+def run_script(socket_path, script, argv=(), return_globals=True):
+    '''Client side: run script on the server listening at socket_path and return its result'''
+    request = {'script': os.path.abspath(script), 'argv': list(argv), 'globals': return_globals,
+               'cwd': os.getcwd()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode('utf-8') + b'\n')
+            stream.flush()
+            return json.loads(stream.readline())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Warm pool for repeated script execution')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve')
+    serve.add_argument('--socket', required=True)
+    serve.add_argument('--workers', type=int, default=4)
+    serve.add_argument('--max-runs', type=int, default=100)
+    serve.add_argument('--preload', nargs='*', default=list(DEFAULT_PRELOAD))
+    run = commands.add_parser('run')
+    run.add_argument('--socket', required=True)
+    run.add_argument('script')
+    run.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        with ScriptServer(args.socket, args.workers, args.max_runs, args.preload) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    else:
+        result = run_script(args.socket, args.script, args.args)
+        sys.stdout.write(result.get('stdout', ''))
+        sys.stderr.write(result.get('stderr', ''))
+        if not result['ok']:
+            sys.stderr.write(result['error'])
+            sys.exit(1)
+        sys.exit(result.get('exit_code', 0))
+
+
+if __name__ == '__main__':
+    main()
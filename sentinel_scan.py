@@ -0,0 +1,103 @@
+# sentinel_scan.py
+
+# 'for value in sequence: if value == 5: break; total_until_5 += value' aggregates a stream up to
+# a sentinel one element at a time. scan_until() reads the stream in fixed-size chunks, locates
+# the first matching element of each chunk with a vectorized comparison and argmax, and stops
+# reading at the chunk where the sentinel appears, returning the aggregate of everything before
+# it. Arrays and memory maps are sliced in place; iterators and generators are pulled into a
+# typed buffer one chunk at a time.
+
+import itertools
+
+import numpy as np
+
+# Elements examined per chunk
+CHUNK_SIZE = 1 << 16
+
+
+def _chunks(source, chunk_size, dtype):
+    if isinstance(source, np.ndarray):
+        flat = source.reshape(-1)
+        for start in range(0, flat.size, chunk_size):
+            yield flat[start:start + chunk_size]
+    else:
+        iterator = iter(source)
+        while True:
+            chunk = np.fromiter(itertools.islice(iterator, chunk_size), dtype=dtype)
+            if chunk.size == 0:
+                return
+            yield chunk
+
+
+def scan_until(source, sentinel=None, predicate=None, reduce=np.add, chunk_size=CHUNK_SIZE,
+               dtype=np.float64):
+    '''
+    Aggregate the elements of source that come before the first match
+
+    Parameters
+    ----------
+    source : ndarray, memmap or any iterable of numbers
+    sentinel : value that ends the scan (compared with ==)
+    predicate : alternatively, a vectorized function mapping a chunk to a boolean array
+    reduce : ufunc used to aggregate the prefix (np.add, np.maximum, ...)
+    chunk_size : elements read per chunk
+    dtype : dtype used to buffer elements from iterables
+
+    Returns
+    -------
+    total : reduce over the elements before the first match (None if that prefix is empty and
+            the ufunc has no identity)
+    index : position of the first match, or None if the stream ended without one
+    '''
+    if (sentinel is None) == (predicate is None):
+        raise ValueError('pass exactly one of sentinel and predicate')
+    if predicate is None:
+        predicate = lambda chunk: chunk == sentinel
+
+    total = None
+    offset = 0
+    for chunk in _chunks(source, chunk_size, dtype):
+        hits = np.asarray(predicate(chunk), dtype=bool)
+        # argmax returns the first True, but also 0 when nothing matched, hence the check
+        first = int(hits.argmax())
+        found = bool(hits[first])
+        prefix = chunk[:first] if found else chunk
+        if prefix.size:
+            part = reduce.reduce(prefix)
+            total = part if total is None else reduce(total, part)
+        if found:
+            return _finish(total, reduce, dtype), offset + first
+        offset += chunk.size
+    return _finish(total, reduce, dtype), None
+
+
+def _finish(total, reduce, dtype):
+    if total is None and reduce.identity is not None:
+        return np.dtype(dtype).type(reduce.identity)
+    return total
+
+
+def find_first(source, sentinel=None, predicate=None, chunk_size=CHUNK_SIZE, dtype=np.float64):
+    '''Position of the first element equal to sentinel (or matching predicate), or None'''
+    if (sentinel is None) == (predicate is None):
+        raise ValueError('pass exactly one of sentinel and predicate')
+    if predicate is None:
+        predicate = lambda chunk: chunk == sentinel
+
+    offset = 0
+    for chunk in _chunks(source, chunk_size, dtype):
+        hits = np.asarray(predicate(chunk), dtype=bool)
+        first = int(hits.argmax())
+        if hits[first]:
+            return offset + first
+        offset += chunk.size
+    return None
+
+
+if __name__ == '__main__':
+    sequence = [1, 2, 0, 4, 6, 5, 2, 1]
+    total_until_5, index = scan_until(sequence, sentinel=5, chunk_size=3)
+    print(total_until_5, index)
+
+    stream = (x for x in np.random.randn(1_000_000))
+    print(scan_until(stream, predicate=lambda chunk: chunk > 4))
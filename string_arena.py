@@ -0,0 +1,166 @@
+# string_arena.py
+
+# my_string.encode('utf-8') and my_bytes.decode('utf-8') convert one object at a time, and a list
+# of millions of short strings carries roughly 50 bytes of object overhead per entry. StringArena
+# stores a whole column as one contiguous UTF-8 buffer plus an array of offsets. Elements are
+# handed out as zero-copy memoryview slices of the buffer and only decoded to str on access, and
+# the whole buffer can be checked for valid UTF-8 in one vectorized pass.
+
+import itertools
+
+import numpy as np
+
+# Strings encoded per batch when building from a generator
+BATCH_SIZE = 1 << 16
+
+
+class StringArena:
+    '''
+    A column of strings stored as a single UTF-8 buffer
+
+    Parameters
+    ----------
+    data : bytes-like UTF-8 buffer holding every element back to back
+    offsets : integer array of length n + 1; element i is data[offsets[i]:offsets[i + 1]]
+    '''
+
+    def __init__(self, data, offsets):
+        self.data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) \
+            else data
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if self.offsets.ndim != 1 or len(self.offsets) == 0 or self.offsets[0] != 0 \
+                or self.offsets[-1] != len(self.data) or (np.diff(self.offsets) < 0).any():
+            raise ValueError('offsets must start at 0, end at len(data) and never decrease')
+        self._view = memoryview(self.data)
+
+    @classmethod
+    def from_strings(cls, strings, encoding='utf-8', batch_size=BATCH_SIZE):
+        '''
+        Build an arena from any iterable of str (or bytes, taken as already encoded). Generators
+        are consumed in batches so only one batch of encoded objects exists at a time.
+        '''
+        chunks = []
+        lengths = []
+        iterator = iter(strings)
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                break
+            encoded = [s if isinstance(s, bytes) else s.encode(encoding) for s in batch]
+            lengths.append(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+            chunks.append(b''.join(encoded))
+
+        offsets = np.zeros(sum(map(len, lengths)) + 1, dtype=np.int64)
+        if lengths:
+            np.cumsum(np.concatenate(lengths), out=offsets[1:])
+        return cls(b''.join(chunks), offsets)
+
+    @classmethod
+    def from_array(cls, arr):
+        '''Build an arena from a NumPy 'U' or 'S' array (trailing NULs are dropped, as in NumPy)'''
+        arr = np.asarray(arr).reshape(-1)
+        if arr.dtype.kind == 'U':
+            arr = np.char.encode(arr, 'utf-8')
+        elif arr.dtype.kind != 'S':
+            raise TypeError(f'expected a string or bytes array, got dtype {arr.dtype}')
+        lengths = np.char.str_len(arr)
+        width = arr.itemsize
+        matrix = np.ascontiguousarray(arr).view(np.uint8).reshape(len(arr), width)
+        keep = np.arange(width) < lengths[:, None]
+        offsets = np.zeros(len(arr) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(matrix[keep], offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        preview = ', '.join(repr(self[i]) for i in range(min(len(self), 5)))
+        more = ', ...' if len(self) > 5 else ''
+        return f'StringArena([{preview}{more}], n={len(self)}, nbytes={self.nbytes})'
+
+    def get_bytes(self, i):
+        '''Element i as a zero-copy memoryview of the underlying buffer'''
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('StringArena index out of range')
+        return self._view[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError('only contiguous slices are supported')
+            stop = max(start, stop)
+            lo, hi = self.offsets[start], self.offsets[stop]
+            return StringArena(self.data[lo:hi], self.offsets[start:stop + 1] - lo)
+        return str(self.get_bytes(index), 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield str(self._view[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def tolist(self):
+        return list(self)
+
+    def lengths(self):
+        '''Length of each element in bytes'''
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+    def invalid(self):
+        '''
+        Indices of elements that are not valid UTF-8, found with one vectorized pass over the
+        buffer (truncated or overlong sequences, surrogates, code points past U+10FFFF, and
+        characters split across element boundaries)
+        '''
+        b = self.data
+        if len(b) == 0:
+            return np.array([], dtype=np.int64)
+
+        # Every character starts at a non-continuation byte; element starts are forced to be
+        # boundaries too, so a character split across two elements counts as truncated
+        continuation = (b & 0xC0) == 0x80
+        boundary = ~continuation
+        boundary[self.offsets[:-1][self.lengths() > 0]] = True
+        starts = np.flatnonzero(boundary)
+        lead = b[starts]
+        expected = np.select([lead < 0x80, (lead >= 0xC2) & (lead <= 0xDF),
+                              (lead >= 0xE0) & (lead <= 0xEF), (lead >= 0xF0) & (lead <= 0xF4)],
+                             [0, 1, 2, 3], default=-1)
+        # Continuation bytes that actually follow each lead byte before the next boundary
+        following = np.diff(np.append(starts, len(b))) - 1
+
+        second = b[np.minimum(starts + 1, len(b) - 1)]
+        bad = (expected != following) \
+            | ((lead == 0xE0) & (second < 0xA0)) | ((lead == 0xED) & (second >= 0xA0)) \
+            | ((lead == 0xF0) & (second < 0x90)) | ((lead == 0xF4) & (second >= 0x90))
+
+        elements = np.searchsorted(self.offsets, starts[bad], side='right') - 1
+        return np.unique(elements)
+
+    def validate(self):
+        '''Raise UnicodeDecodeError naming the first invalid element, if any'''
+        invalid = self.invalid()
+        if len(invalid):
+            i = int(invalid[0])
+            raw = bytes(self.get_bytes(i))
+            raw.decode('utf-8')
+            raise UnicodeDecodeError('utf-8', raw, 0, len(raw), f'element {i} is not valid UTF-8')
+        return self
+
+
+if __name__ == '__main__':
+    import sys
+
+    words = ['espa\xf1ol', 'foo', '', 'bar'] * 250_000
+    arena = StringArena.from_strings(words).validate()
+    assert arena[0] == 'espa\xf1ol' and bytes(arena.get_bytes(0)) == 'espa\xf1ol'.encode('utf-8')
+    encoded = [w.encode('utf-8') for w in words]
+    list_bytes = sys.getsizeof(encoded) + sum(map(sys.getsizeof, encoded))
+    print(arena)
+    print(f'list of bytes objects: {list_bytes} bytes')
@@ -0,0 +1,160 @@
+# transpose.py
+
+# arr.T, arr.transpose((1, 0, 2)) and arr.swapaxes(1, 2) return strided views. The first consumer
+# that needs contiguous memory pays for a copy that walks one side of the copy against the grain
+# of memory. permute() materializes the permuted layout tile by tile instead, so both the reads
+# and the writes of each tile stay cache-resident, and large arrays are split across threads.
+#
+# To compare against the naive copy from the terminal:
+#
+# > python transpose.py --max-bytes 4e9
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from array_gather import run_blocks
+
+# Arrays smaller than this are permuted on the calling thread
+PARALLEL_THRESHOLD = 16 * 1024 * 1024
+
+
+def _block_shape(shape, tiled_axes, tile, tile_bytes, itemsize):
+    '''Block size along each output axis so one tile holds roughly tile_bytes'''
+    blocks = [1] * len(shape)
+    budget = max(1, tile_bytes // itemsize)
+    for axis in tiled_axes:
+        blocks[axis] = min(shape[axis], tile)
+        budget = max(1, budget // blocks[axis])
+    # Fill the remaining budget from the innermost untiled axis outwards
+    for axis in reversed(range(len(shape))):
+        if axis not in tiled_axes:
+            blocks[axis] = max(1, min(shape[axis], budget))
+            budget = max(1, budget // blocks[axis])
+    # With no untiled axis to absorb it (a 2D transpose), grow the tiled axes evenly instead: a
+    # 64 x 64 float64 tile is only 32 KB, and every tile costs a Python-level assignment
+    factor = budget ** (1 / len(tiled_axes))
+    for axis in tiled_axes:
+        blocks[axis] = min(shape[axis], int(blocks[axis] * factor))
+    return blocks
+
+
+def permute(arr, axes=None, out=None, tile=64, tile_bytes=256 * 1024, n_threads=None):
+    '''
+    Materialize arr.transpose(axes) into C-contiguous memory using cache-sized tiles
+
+    Parameters
+    ----------
+    arr : ndarray
+    axes : permutation of the axes, defaults to reversing them (like arr.T)
+    out : optional C-contiguous ndarray of the permuted shape and arr.dtype
+    tile : minimum tile edge length along the two axes being exchanged (grown towards tile_bytes
+           when no other axis can take up the rest of the tile)
+    tile_bytes : approximate size of one tile, used to size the remaining axes
+    n_threads : number of worker threads, defaults to the CPU count for large arrays
+
+    Returns
+    -------
+    out : ndarray equal to np.ascontiguousarray(arr.transpose(axes))
+    '''
+    arr = np.asarray(arr)
+    if axes is None:
+        axes = tuple(reversed(range(arr.ndim)))
+    axes = tuple(axis % arr.ndim for axis in axes) if arr.ndim else ()
+    view = arr.transpose(axes)
+
+    if out is None:
+        out = np.empty(view.shape, dtype=arr.dtype)
+    elif out.shape != view.shape or out.dtype != arr.dtype or not out.flags.c_contiguous:
+        raise ValueError(f'out must be C-contiguous with shape {view.shape} and dtype {arr.dtype}')
+
+    if arr.ndim < 2 or out.size == 0:
+        out[...] = view
+        return out
+
+    # The output's innermost axis and the axis holding the source's innermost axis are the two
+    # that run against each other; tile both of them (they coincide when no exchange happens).
+    inner_out = arr.ndim - 1
+    inner_src = axes.index(arr.ndim - 1)
+    tiled_axes = sorted({inner_out, inner_src})
+    blocks = _block_shape(out.shape, tiled_axes, tile, tile_bytes, arr.itemsize)
+
+    starts = [range(0, dim, block) for dim, block in zip(out.shape, blocks)]
+    tiles = [tuple(slice(s, s + b) for s, b in zip(start, blocks))
+             for start in itertools.product(*starts)]
+
+    def copy_tile(index):
+        out[index] = view[index]
+
+    run_blocks(copy_tile, tiles, out.nbytes, n_threads, PARALLEL_THRESHOLD)
+    return out
+
+
+def transpose(arr, out=None, **kwargs):
+    '''Contiguous equivalent of arr.T'''
+    return permute(arr, None, out=out, **kwargs)
+
+
+def swapaxes(arr, axis1, axis2, out=None, **kwargs):
+    '''Contiguous equivalent of arr.swapaxes(axis1, axis2)'''
+    axes = list(range(arr.ndim))
+    axes[axis1], axes[axis2] = axes[axis2], axes[axis1]
+    return permute(arr, axes, out=out, **kwargs)
+
+
+def best_time(func, repeat):
+    '''Best wall-clock seconds of repeat calls of func'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(max_bytes=1e9, dtype=np.float64, repeat=3):
+    '''
+    Time permute() against np.ascontiguousarray on the strided view for 2D and 3D shapes, doubling
+    the array size until max_bytes. Returns a list of result dicts.
+    '''
+    itemsize = np.dtype(dtype).itemsize
+    cases = [
+        ('2d transpose', lambda n: (n, n), (1, 0)),
+        ('3d (1, 0, 2)', lambda n: (n // 8, n // 8, 64), (1, 0, 2)),
+        ('3d swapaxes(1, 2)', lambda n: (64, n // 8, n // 8), (0, 2, 1)),
+    ]
+    results = []
+    for name, make_shape, axes in cases:
+        n = 1024
+        while True:
+            shape = make_shape(n)
+            nbytes = int(np.prod(shape)) * itemsize
+            if nbytes > max_bytes:
+                break
+            arr = np.ones(shape, dtype=dtype)
+            out = np.empty(arr.transpose(axes).shape, dtype=dtype)
+            naive = best_time(lambda: np.ascontiguousarray(arr.transpose(axes)), repeat)
+            tiled = best_time(lambda: permute(arr, axes, out=out), repeat)
+            results.append({'case': name, 'shape': shape, 'bytes': nbytes,
+                            'naive_s': naive, 'tiled_s': tiled, 'speedup': naive / tiled})
+            del arr, out
+            n = int(n * 2 ** 0.5)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark tiled permute against naive copies')
+    parser.add_argument('--max-bytes', type=float, default=1e9)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f'{"case":<20}{"shape":>22}{"MB":>10}{"naive s":>10}{"tiled s":>10}{"speedup":>9}')
+    for row in benchmark(args.max_bytes, repeat=args.repeat):
+        print(f'{row["case"]:<20}{str(row["shape"]):>22}{row["bytes"] / 1e6:>10.1f}'
+              f'{row["naive_s"]:>10.4f}{row["tiled_s"]:>10.4f}{row["speedup"]:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()